@@ -0,0 +1,101 @@
+import numpy as np
+
+
+"""
+
+Буфер событий: структурированный массив numpy с колонками t, x, y, p.
+Используется входным слоем (генерация), скрытым слоем и визуализацией.
+
+Буфер спайков (SpikeBuffer): параллельные массивы времен и номеров нейронов.
+
+"""
+
+
+# Тип одного события
+EVENT_DTYPE = np.dtype([
+    ("t", np.float64),      # время события (мс)
+    ("x", np.int32),        # координата пикселя по ширине
+    ("y", np.int32),        # координата пикселя по высоте
+    ("p", np.int8)          # полярность (1 - on, 0 - off)
+])
+
+
+
+
+# Пустой буфер на n событий
+def empty_events(n=0):
+    return np.empty(n, dtype=EVENT_DTYPE)
+
+
+
+# Буфер из списка кортежей (t, x, y, p)
+def events_from_list(events):
+    return np.array([tuple(ev) for ev in events], dtype=EVENT_DTYPE)
+
+
+
+# Объединение нескольких буферов в один (порядок сохраняется)
+def concat_events(chunks):
+    chunks = [c for c in chunks if len(c) > 0]
+    if not chunks:
+        return empty_events()
+    return np.concatenate(chunks)
+
+
+
+
+# Буфер спайков слоя: заранее выделенные массивы, которые растут при заполнении
+class SpikeBuffer:
+    __slots__ = ("_times", "_neurons", "_size")
+
+    def __init__(self, capacity=64):
+        self._times = np.empty(capacity, np.float64)
+        self._neurons = np.empty(capacity, np.int32)
+        self._size = 0
+
+
+    # Добавление спайка (t - время, neuron - номер нейрона)
+    def append(self, t, neuron):
+        if self._size == self._times.size:
+            self._grow()
+        self._times[self._size] = t
+        self._neurons[self._size] = neuron
+        self._size += 1
+
+
+    # Очистка без освобождения памяти
+    def clear(self):
+        self._size = 0
+
+
+    # Времена спайков (представление, без копирования)
+    @property
+    def times(self):
+        return self._times[:self._size]
+
+
+    # Номера сработавших нейронов (представление, без копирования)
+    @property
+    def neurons(self):
+        return self._neurons[:self._size]
+
+
+    # Количество спайков каждого нейрона
+    def counts(self, num_neurons):
+        return np.bincount(self.neurons, minlength=num_neurons)
+
+
+    def __len__(self):
+        return self._size
+
+
+    # Перебор пар (t, номер нейрона)
+    def __iter__(self):
+        return zip(self.times.tolist(), self.neurons.tolist())
+
+
+    # Увеличение емкости вдвое
+    def _grow(self):
+        capacity = 2 * self._times.size
+        self._times = np.resize(self._times, capacity)
+        self._neurons = np.resize(self._neurons, capacity)
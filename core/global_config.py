@@ -2,6 +2,10 @@
 # Размер окна обзора камеры (в пикселях)
 IMAGE_HEIGHT = 28
 IMAGE_WIDTH  = 28
+# Время между соседними кадрами датасета (мс)
+FRAME_DT_MS = 16.7
+# Путь к датасету .pkl
+DATASET_PATH = "data/dataset_custom.pkl"
 
 
 """Константы скрытого слоя"""
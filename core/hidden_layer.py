@@ -1,6 +1,9 @@
 import numpy as np
 import core.global_config as cfg
 from core.learning import update_weights_stdp
+from core.params import NetworkParams
+from core.events import SpikeBuffer
+from core.quantization import weight_scale, quantize_weights, dequantize_weights
 
 
 """
@@ -11,113 +14,345 @@ from core.learning import update_weights_stdp
 """
 
 
+# Максимальное количество событий, обрабатываемых hidden_layer_run одним блоком
+RUN_CHUNK = 128
+# Относительный запас до порога: если потенциал подходит к порогу ближе,
+# событие обрабатывается точно, через hidden_layer_step
+RUN_MARGIN = 1e-3
+# Максимальная длительность блока (в единицах TAU_LEAK), чтобы множители затухания
+# оставались в пределах точности float64
+RUN_MAX_SPAN = 20.0
+# Ширина временного окна (мс) для hidden_layer_run_binned
+BIN_MS = 1.0
+
+
+# Состояние скрытого слоя
+class HiddenLayerState:
+    __slots__ = (
+        "params", "u", "last_input_times", "last_update", "last_spike",
+        "inhibited_until", "weights", "spikes", "thresh", "inactivity",
+        "w_scale"
+    )
+
+    def __init__(self, params, weights, w_scale=None):
+        input_size = weights.shape[1]
+        # Гиперпараметры сети
+        self.params = params
+        # Текущее значение потенциала для каждого нейрона сети
+        self.u = np.zeros(cfg.COUNT_NEURONS, np.float32)
+        # Время последней активации каждого входа
+        self.last_input_times = np.zeros(input_size, np.float32)
+        # Время последнего обновления потенциала нейронов
+        self.last_update = 0.0
+        # Время последнего спайка каждого нейрона сети
+        self.last_spike = np.full(cfg.COUNT_NEURONS, -np.inf, np.float32)
+        # Время окончания периода ингибирования для каждого нейрона
+        self.inhibited_until = np.zeros(cfg.COUNT_NEURONS, np.float32)
+        # Матрица весов (нейроны, входы), хранится по входам (порядок Fortran):
+        # веса одного входа для всех нейронов лежат в памяти подряд,
+        # поэтому выборка столбцов при накоплении событий читает непрерывные блоки.
+        # Индексация та же, что у обычной матрицы, и обновления STDP по строкам
+        # пишут в ту же память, так что отдельная копия не нужна
+        self.weights = np.asfortranarray(weights)
+        # Спайки: параллельные массивы (момент времени, номер нейрона)
+        self.spikes = SpikeBuffer()
+        # Вектор индивидуальных порогов нейронов
+        self.thresh = np.full(cfg.COUNT_NEURONS, params.I_THRES, np.float32)
+        # (для обучения: сколько примеров подряд нейрон молчит)
+        self.inactivity = np.zeros(cfg.COUNT_NEURONS, np.int32)
+        # Шаг квантования, если weights хранит целые коды (см. core.quantization);
+        # None - веса в float32
+        self.w_scale = w_scale
+
+
+
+
 # Инициализация скрытого слоя
-def init_hidden_layer():
+def init_hidden_layer(
+        params=None,                # гиперпараметры сети (NetworkParams); по умолчанию из global_config
+        weight_dtype=np.float32     # тип весов: float32 или квантованные uint8 / uint16
+):
+    """
+
+    При weight_dtype=uint8 / uint16 веса хранятся кодами с фиксированной точкой
+    (core.quantization), а STDP записывает их со стохастическим округлением.
+
+    """
+    if params is None:
+        params = NetworkParams.from_config()
+    w_scale = weight_scale(params, weight_dtype)
     # Количество входов (на каждый пиксель 2 состояния)
     input_size = cfg.IMAGE_HEIGHT * cfg.IMAGE_WIDTH * 2
     # Инициализация весов
     weights = np.clip(
         np.random.normal(
-            cfg.W_INIT_MEAN, cfg.W_INIT_STD, (cfg.COUNT_NEURONS, input_size)
+            params.W_INIT_MEAN, params.W_INIT_STD, (cfg.COUNT_NEURONS, input_size)
         ),
-        cfg.W_MIN, cfg.W_MAX
+        params.W_MIN, params.W_MAX
     ).astype(np.float32)
+    if w_scale is not None:
+        weights = quantize_weights(weights, params.W_MIN, w_scale, weight_dtype)
 
-    return {
-        # Текущее значение потенциала для каждого нейрона сети
-        "u": np.zeros(cfg.COUNT_NEURONS, np.float32),
-        # Время последней активации каждого входа
-        "last_input_times": np.zeros(input_size, np.float32),
-        # Время последнего обновления потенциала нейронов
-        "last_update": 0.0,
-        # Время последнего спайка каждого нейрона сети
-        "last_spike": np.full(cfg.COUNT_NEURONS, -np.inf, np.float32),
-        # Время окончания периода ингибирования для каждого нейрона
-        "inhibited_until": np.zeros(cfg.COUNT_NEURONS, np.float32),
-        # Матрица весов
-        "weights": weights,
-        # Массив спайков: (момент времени, номер нейрона)
-        "spikes": [],
-        # Вектор индивидуальных порогов нейронов
-        "thresh": np.full(cfg.COUNT_NEURONS, cfg.I_THRES, np.float32),
-        # (для обучения: сколько примеров подряд нейрон молчит)
-        "inactivity": np.zeros(cfg.COUNT_NEURONS, np.int32)
-    }
+    return HiddenLayerState(params, weights, w_scale)
 
 
 
 
 # Сброс настроек скрытого слоя
 def reset_hidden_layer(state):
-    state["u"].fill(0.0)
-    state["last_update"] = 0.0
-    state["last_spike"].fill(-np.inf)
-    state["inhibited_until"].fill(0.0)
-    state["last_input_times"].fill(0.0)
-    state["spikes"].clear()
+    state.u.fill(0.0)
+    state.last_update = 0.0
+    state.last_spike.fill(-np.inf)
+    state.inhibited_until.fill(0.0)
+    state.last_input_times.fill(0.0)
+    state.spikes.clear()
+
+
+
+# Матрица весов в float32 (с учетом квантования)
+def hidden_weights(state):
+    return _weight_values(state, slice(None), slice(None))
 
 
 
 # Получение и накопление событий
 def hidden_layer_step(
-        state,          # словарь параметров сети
+        state,          # состояние скрытого слоя (HiddenLayerState)
         event,          # событие из input_layer
         train=True,     # если True, веса меняются; иначе зафиксированы
         norm_factor=1
 ):
+    params = state.params
     # Извлекаем время события, координаты пикселя и полярность
     t, x, y, p = event
     # Определяем индекс входа
     input_id = 2 * (y * cfg.IMAGE_WIDTH + x) + p
 
     # Экспоненциальное затухание потенциалов нейронов
-    dt = t - state["last_update"]
+    dt = t - state.last_update
     if dt > 0:
-        state["u"] *= np.exp(-dt / cfg.TAU_LEAK)
+        state.u *= np.exp(-dt * params.INV_TAU_LEAK)
         # Фиксируем время последнего обновления потенциалов
-        state["last_update"] = t
+        state.last_update = t
     
     # Добавляем вклад только тем нейронам, которые не подавлены
     mask_active = (
-        (t >= state["inhibited_until"]) &
-        (t >= state["last_spike"] + cfg.T_REF)
+        (t >= state.inhibited_until) &
+        (t >= state.last_spike + params.T_REF)
     )
-    state["u"][mask_active] += norm_factor * state["weights"][mask_active, input_id]
+    state.u[mask_active] += norm_factor * _weight_values(state, mask_active, input_id)
     
     # Фиксируем время последней активации входа input_id
-    state["last_input_times"][input_id] = t
+    state.last_input_times[input_id] = t
 
     # Если были спайки у одного или нескольких нейронов
-    gave_spike = np.where(state["u"] > state["thresh"])[0]
-    if gave_spike.size > 0:
-        # Создаем копию потенциалов, чтобы не изменить значения
-        u_copy = state["u"].copy()
-
-        # Генерируем небольшой случайный шум
-        noise = np.random.uniform(0, 1e-3, u_copy.shape)
-        # Добавляем его к реальным потенциалам, чтобы избежать случая, 
-        # когда значение потенциала нескольких нейронов одинаково
-        u_copy += noise
-        # Победителем считаем нейрон с максимальным потенциалом
-        winner_index = np.argmax(u_copy)
-
-        # Фиксируем время спайка и номер сработавшего нейрона
-        state["spikes"].append((t, winner_index))
-        # Обновляем время последнего спайка победившего нейрона
-        state["last_spike"][winner_index] = t
-        # Сбрасываем потенциал
-        state["u"][winner_index] = 0.0
-
-        # Латеральное торможение
-        mask_inhibit = np.arange(cfg.COUNT_NEURONS) != winner_index
-        state["inhibited_until"][mask_inhibit] = t + cfg.T_INHIBIT
-
-        # Если сеть обучается, то обновляем веса для победителя по правилу STDP
-        if train:
-            update_weights_stdp(
-                t_post=t,
-                synapse_weights=state["weights"][winner_index],
-                last_input_times=state["last_input_times"]
+    if (state.u > state.thresh).any():
+        _fire(state, t, train)
+
+
+
+
+# Обработка массива событий (буфер core.events)
+def hidden_layer_run(
+        state,          # состояние скрытого слоя (HiddenLayerState)
+        events,         # буфер событий из input_layer
+        train=True,     # если True, веса меняются; иначе зафиксированы
+        norm_factor=1
+):
+    """
+
+    Пока ни один нейрон не подходит к порогу, утечка и накопление считаются
+    для блока событий сразу; события рядом с пересечением порога
+    (спайк, латеральное торможение, STDP) обрабатываются по одному.
+    Результат не совпадает бит в бит с вызовом hidden_layer_step для каждого события:
+    потенциалы отличаются на ошибку округления (порядка 1e-4 при порогах ~500).
+    Если потенциал проходит порог с меньшим запасом, спайк будет только в одном
+    из режимов, и дальше спайки и веса расходятся; поэтому evaluate_selectivity
+    и SNN_Controller используют этот режим только по явному выбору
+    (genetic.ga_config.CHUNKED_RUN, SNN_Controller(chunked=True)).
+    Оценка расхождения на параметрах ГА - utils.compare_modes.compare_run_step.
+
+    """
+    num_events = len(events)
+    i = 0
+    while i < num_events:
+        # Сколько событий блока можно учесть без спайков
+        chunk = events[i:i + RUN_CHUNK]
+        num_done = _accumulate_subthreshold(state, chunk, norm_factor)
+        i += num_done
+        # Следующее событие может вызвать спайк - обрабатываем его точно
+        if num_done < len(chunk):
+            hidden_layer_step(
+                state=state,
+                event=events[i],
+                train=train,
+                norm_factor=norm_factor
             )
+            i += 1
+
+
+
+# Обработка массива событий по временным окнам фиксированной ширины (приближенно)
+def hidden_layer_run_binned(
+        state,          # состояние скрытого слоя (HiddenLayerState)
+        events,         # буфер событий из input_layer
+        bin_ms=BIN_MS,  # ширина окна (мс)
+        train=True,     # если True, веса меняются; иначе зафиксированы
+        norm_factor=1
+):
+    """
+
+    События одного окна [k * bin_ms, (k + 1) * bin_ms) суммируются одним
+    произведением весов на вектор счетчиков входов и приходят к нейронам
+    одновременно, в момент последнего события окна. Затем, как и в hidden_layer_step,
+    выполняются затухание, выбор победителя, латеральное торможение и STDP;
+    в одном окне срабатывает не более одного нейрона.
+    Отличия от событийного режима (hidden_layer_step / hidden_layer_run):
+    внутри окна нет затухания, маска активных нейронов и порог проверяются
+    один раз в конце окна. События с одинаковым временем всегда попадают в одно окно,
+    поэтому режимы не совпадают даже при очень малом bin_ms: в событийном режиме
+    после спайка торможение отсекает вклад остальных событий того же момента.
+    Оценка расхождения - utils.compare_modes.
+
+    """
+    if len(events) == 0:
+        return
+    params = state.params
+    t = events["t"]
+    input_ids = 2 * (events["y"] * cfg.IMAGE_WIDTH + events["x"]) + events["p"]
+
+    # Границы окон внутри буфера (события отсортированы по времени)
+    bins = np.floor(t / bin_ms)
+    bounds = np.concatenate(([0], np.flatnonzero(np.diff(bins)) + 1, [len(t)]))
+
+    for start, stop in zip(bounds[:-1], bounds[1:]):
+        t_bin = t[stop - 1]
+        # Счетчики входов окна; при повторах время активации - последнее событие
+        ids_rev = input_ids[start:stop][::-1]
+        uniq, last_pos, counts = np.unique(ids_rev, return_index=True, return_counts=True)
+
+        # Экспоненциальное затухание до конца окна
+        dt = t_bin - state.last_update
+        if dt > 0:
+            state.u *= np.exp(-dt * params.INV_TAU_LEAK)
+            state.last_update = t_bin
+
+        # Вклад окна получают только не подавленные нейроны
+        mask_active = (
+            (t_bin >= state.inhibited_until) &
+            (t_bin >= state.last_spike + params.T_REF)
+        )
+        drive = _weight_values(state, slice(None), uniq) @ counts.astype(np.float32)
+        state.u[mask_active] += norm_factor * drive[mask_active]
+
+        state.last_input_times[uniq] = t[start:stop][::-1][last_pos]
+
+        if (state.u > state.thresh).any():
+            _fire(state, t_bin, train)
+
+
+
+# Векторное накопление блока событий до первого события, близкого к порогу
+def _accumulate_subthreshold(state, events, norm_factor):
+    """
+
+    Рекуррентность hidden_layer_step между спайками
+        u_k = u_{k-1} * exp(-(t_k - t_{k-1}) / TAU_LEAK) + w_k * active_k
+    разворачивается через накопленную сумму вкладов, приведенных к началу блока.
+    Возвращает количество учтенных событий.
+
+    """
+    params = state.params
+    t = events["t"]
+    input_ids = 2 * (events["y"] * cfg.IMAGE_WIDTH + events["x"]) + events["p"]
+
+    # Время обновления потенциалов после каждого события (затухание только вперед по времени)
+    t_upd = np.maximum.accumulate(np.maximum(t, state.last_update))
+    # Не берем в блок события, слишком далекие от его начала
+    span = t_upd - t_upd[0]
+    size = np.searchsorted(span, RUN_MAX_SPAN * params.TAU_LEAK, side="right")
+    t, input_ids, t_upd, span = t[:size], input_ids[:size], t_upd[:size], span[:size]
+
+    # Потенциалы к моменту первого события и затухание относительно него
+    u0 = state.u * np.exp(-(t_upd[0] - state.last_update) * params.INV_TAU_LEAK)
+    decay = np.exp(-span * params.INV_TAU_LEAK)[:, None]
+
+    # Активные нейроны для каждого события (спайков внутри блока нет, поэтому маски не меняются)
+    active = (
+        (t[:, None] >= state.inhibited_until) &
+        (t[:, None] >= state.last_spike + params.T_REF)
+    )
+    contrib = norm_factor * _weight_values(state, slice(None), input_ids).T * active
+    u = decay * (u0 + np.cumsum(contrib / decay, axis=0))
+
+    # Первое событие, после которого потенциал хотя бы одного нейрона близок к порогу
+    near = (u > state.thresh - RUN_MARGIN * np.abs(state.thresh)).any(axis=1)
+    num_done = int(np.argmax(near)) if near.any() else size
+    if num_done == 0:
+        return 0
+
+    # Фиксируем состояние после последнего учтенного события
+    state.u[:] = u[num_done - 1]
+    state.last_update = max(state.last_update, t_upd[num_done - 1])
+    # Время последней активации входов (при повторах берем последнее событие)
+    ids_rev = input_ids[:num_done][::-1]
+    uniq, last_pos = np.unique(ids_rev, return_index=True)
+    state.last_input_times[uniq] = t[:num_done][::-1][last_pos]
+    return num_done
+
+
+
+# Спайк победителя в момент t: сброс, латеральное торможение и STDP
+def _fire(state, t, train):
+    params = state.params
+    # Создаем копию потенциалов, чтобы не изменить значения
+    u_copy = state.u.copy()
+
+    # Генерируем небольшой случайный шум
+    noise = np.random.uniform(0, 1e-3, u_copy.shape)
+    # Добавляем его к реальным потенциалам, чтобы избежать случая, 
+    # когда значение потенциала нескольких нейронов одинаково
+    u_copy += noise
+    # Победителем считаем нейрон с максимальным потенциалом
+    winner_index = np.argmax(u_copy)
+
+    # Фиксируем время спайка и номер сработавшего нейрона
+    state.spikes.append(t, winner_index)
+    # Обновляем время последнего спайка победившего нейрона
+    state.last_spike[winner_index] = t
+    # Сбрасываем потенциал
+    state.u[winner_index] = 0.0
+
+    # Латеральное торможение
+    mask_inhibit = np.arange(cfg.COUNT_NEURONS) != winner_index
+    state.inhibited_until[mask_inhibit] = t + params.T_INHIBIT
+
+    # Если сеть обучается, то обновляем веса для победителя по правилу STDP
+    if train and state.w_scale is not None:
+        # Квантованные веса: обновляем значения и записываем коды со стохастическим округлением
+        row = _weight_values(state, winner_index, slice(None))
+        update_weights_stdp(
+            t_post=t,
+            synapse_weights=row,
+            last_input_times=state.last_input_times,
+            params=params
+        )
+        state.weights[winner_index] = quantize_weights(
+            row, params.W_MIN, state.w_scale, state.weights.dtype
+        )
+    elif train:
+        update_weights_stdp(
+            t_post=t,
+            synapse_weights=state.weights[winner_index],
+            last_input_times=state.last_input_times,
+            params=params
+        )
+
 
 
+# Значения весов state.weights[rows, cols] в float32
+def _weight_values(state, rows, cols):
+    weights = state.weights[rows, cols]
+    if state.w_scale is None:
+        return weights
+    return dequantize_weights(weights, state.params.W_MIN, state.w_scale)
@@ -0,0 +1,172 @@
+import numpy as np
+import core.global_config as cfg
+from core.learning import update_weights_stdp
+from core.params import NetworkParams
+from core.events import SpikeBuffer
+
+
+"""
+
+Популяция скрытых слоев: K сетей с разными гиперпараметрами
+(TAU_LEAK, I_THRES, T_REF, T_INHIBIT, константы STDP) обрабатывают
+один и тот же поток событий одновременно.
+Состояние хранится в массивах с ведущей осью по сетям: потенциалы (K, нейроны),
+веса (K, нейроны, входы). Динамика каждой сети совпадает с core.hidden_layer.
+
+"""
+
+
+# Гиперпараметры, которые участвуют в векторных операциях над всей популяцией
+POPULATION_PARAMS = (
+    "INV_TAU_LEAK", "I_THRES", "T_REF", "T_INHIBIT",
+    "W_INIT_MEAN", "W_INIT_STD", "W_MIN", "W_MAX"
+)
+
+
+
+
+# Состояние популяции скрытых слоев
+class HiddenPopulationState:
+    __slots__ = (
+        "params", "consts", "u", "last_input_times", "last_update", "last_spike",
+        "inhibited_until", "weights", "spikes", "thresh", "inactivity"
+    )
+
+    def __init__(self, params_list, consts, weights):
+        num_nets, _, input_size = weights.shape
+        # Гиперпараметры сетей
+        self.params = params_list
+        # Те же гиперпараметры векторами (K, 1)
+        self.consts = consts
+        # Текущее значение потенциала для каждого нейрона каждой сети
+        self.u = np.zeros((num_nets, cfg.COUNT_NEURONS), np.float32)
+        # Время последней активации каждого входа (поток событий общий для всех сетей)
+        self.last_input_times = np.zeros(input_size, np.float32)
+        # Время последнего обновления потенциалов
+        self.last_update = 0.0
+        # Время последнего спайка каждого нейрона
+        self.last_spike = np.full((num_nets, cfg.COUNT_NEURONS), -np.inf, np.float32)
+        # Время окончания периода ингибирования для каждого нейрона
+        self.inhibited_until = np.zeros((num_nets, cfg.COUNT_NEURONS), np.float32)
+        # Матрицы весов сетей (K, нейроны, входы); внутри каждой сети веса
+        # хранятся по входам, как в core.hidden_layer.HiddenLayerState
+        self.weights = np.ascontiguousarray(weights.transpose(0, 2, 1)).transpose(0, 2, 1)
+        # Спайки каждой сети (буферы core.events.SpikeBuffer)
+        self.spikes = [SpikeBuffer() for _ in range(num_nets)]
+        # Индивидуальные пороги нейронов
+        self.thresh = np.repeat(consts["I_THRES"], cfg.COUNT_NEURONS, axis=1).astype(np.float32)
+        # (для обучения: сколько примеров подряд нейрон молчит)
+        self.inactivity = np.zeros((num_nets, cfg.COUNT_NEURONS), np.int32)
+
+
+
+
+# Инициализация популяции скрытых слоев
+def init_hidden_population(
+        params_list         # список NetworkParams (или словарей, как в genetic.operators)
+):
+    params_list = [
+        params if isinstance(params, NetworkParams) else NetworkParams.from_dict(params)
+        for params in params_list
+    ]
+    num_nets = len(params_list)
+    # Количество входов (на каждый пиксель 2 состояния)
+    input_size = cfg.IMAGE_HEIGHT * cfg.IMAGE_WIDTH * 2
+
+    # Гиперпараметры сетей: по вектору (K, 1) на каждый параметр
+    consts = {
+        key: np.array([getattr(params, key) for params in params_list], np.float64)[:, None]
+        for key in POPULATION_PARAMS
+    }
+
+    # Начальные веса каждой сети по ее собственному распределению
+    weights = np.clip(
+        np.random.normal(
+            consts["W_INIT_MEAN"][:, :, None], consts["W_INIT_STD"][:, :, None],
+            (num_nets, cfg.COUNT_NEURONS, input_size)
+        ),
+        consts["W_MIN"][:, :, None], consts["W_MAX"][:, :, None]
+    ).astype(np.float32)
+
+    return HiddenPopulationState(params_list, consts, weights)
+
+
+
+# Сброс состояния популяции между примерами
+def reset_hidden_population(state):
+    state.u.fill(0.0)
+    state.last_update = 0.0
+    state.last_spike.fill(-np.inf)
+    state.inhibited_until.fill(0.0)
+    state.last_input_times.fill(0.0)
+    for spikes in state.spikes:
+        spikes.clear()
+
+
+
+# Обработка одного события всеми сетями популяции
+def hidden_population_step(
+        state,          # состояние популяции (HiddenPopulationState)
+        event,          # событие из input_layer
+        train=True,     # если True, веса меняются; иначе зафиксированы
+        norm_factor=1
+):
+    consts = state.consts
+    t, x, y, p = event
+    # Определяем индекс входа
+    input_id = 2 * (y * cfg.IMAGE_WIDTH + x) + p
+
+    # Экспоненциальное затухание потенциалов (у каждой сети своя постоянная времени)
+    dt = t - state.last_update
+    if dt > 0:
+        state.u *= np.exp(-dt * consts["INV_TAU_LEAK"])
+        state.last_update = t
+
+    # Вклад получают только не подавленные нейроны
+    mask_active = (
+        (t >= state.inhibited_until) &
+        (t >= state.last_spike + consts["T_REF"])
+    )
+    state.u += mask_active * (norm_factor * state.weights[:, :, input_id])
+
+    # Фиксируем время последней активации входа input_id
+    state.last_input_times[input_id] = t
+
+    # Сети, в которых хотя бы один нейрон превысил порог
+    nets_with_spike = np.nonzero((state.u > state.thresh).any(axis=1))[0]
+    for k in nets_with_spike:
+        _spike(state, k, t, train)
+
+
+
+# Обработка буфера событий всеми сетями популяции
+def hidden_population_run(state, events, train=True, norm_factor=1):
+    for ev in events:
+        hidden_population_step(state, ev, train, norm_factor)
+
+
+
+# Спайк победителя в сети k: торможение остальных и STDP
+def _spike(state, k, t, train):
+    params = state.params[k]
+    u = state.u[k]
+
+    # Победителем считаем нейрон с максимальным потенциалом (шум разбивает равенства)
+    winner_index = np.argmax(u + np.random.uniform(0, 1e-3, u.shape))
+
+    state.spikes[k].append(t, winner_index)
+    state.last_spike[k, winner_index] = t
+    u[winner_index] = 0.0
+
+    # Латеральное торможение
+    mask_inhibit = np.arange(cfg.COUNT_NEURONS) != winner_index
+    state.inhibited_until[k, mask_inhibit] = t + params.T_INHIBIT
+
+    # STDP для весов победителя с константами сети k
+    if train:
+        update_weights_stdp(
+            t_post=t,
+            synapse_weights=state.weights[k, winner_index],
+            last_input_times=state.last_input_times,
+            params=params
+        )
@@ -1,4 +1,5 @@
 import numpy as np
+from core.events import empty_events, events_from_list
 
 
 """
@@ -42,17 +43,46 @@ def generate_events(
         old_frame,          # предыдущий кадр (2D np матрица)
         new_frame,          # новый кадр (2D np матрица)
         prev_t,             # время фиксации предыдущего кадра
-        new_t               # время фиксации нового кадра
+        new_t,              # время фиксации нового кадра
+        vectorized=True,    # если True, кадр обрабатывается целиком операциями numpy
+        roi=None            # (y_min, y_max, x_min, x_max): где кадры могут отличаться
 ):
     """
 
-    Событие - кортеж (t, x, y, p):
+    Возвращает буфер событий (см. core.events), каждое событие - (t, x, y, p):
         t - время, когда пиксель изменил яркость сильнее, чем в exp(threshold) раз
         x, y - координаты пикселя
         p - полярность (p=1, если пиксель стал ярче; p=0, если темнее)
         p=1 => on-событие, p=0 => off-событие
 
+    Обе реализации (векторная и попиксельная) при одинаковом состоянии
+    np.random дают одинаковые события.
+
+    Если задана область roi (например, Tracking_Object.dirty_rect), просматриваются
+    только ее пиксели. Вне области кадры должны совпадать: там, где яркость
+    не изменилась, событий не бывает, поэтому результат тот же, что и без roi.
+
     """
+    generate = _generate_events_vectorized if vectorized else _generate_events_loop
+    if roi is None:
+        return generate(state, old_frame, new_frame, prev_t, new_t)
+
+    y_min, y_max, x_min, x_max = roi
+    if y_min >= y_max or x_min >= x_max:
+        return empty_events()
+    window = (slice(y_min, y_max), slice(x_min, x_max))
+    # Срезы - представления исходных массивов, поэтому состояние обновляется на месте
+    roi_state = {key: arr[window] for key, arr in state.items()}
+    events = generate(roi_state, old_frame[window], new_frame[window], prev_t, new_t)
+    # Возвращаем координаты в систему всего кадра
+    events["x"] += x_min
+    events["y"] += y_min
+    return events
+
+
+
+# Попиксельная генерация событий (эталонная реализация)
+def _generate_events_loop(state, old_frame, new_frame, prev_t, new_t):
     # Размер кадра
     height, width = old_frame.shape
     # Интервал между кадрами в мс (>0)
@@ -120,4 +150,164 @@ def generate_events(
 
     # Сортируем события по времени
     events.sort(key=lambda x: x[0])
+    return events_from_list(events)
+
+
+
+
+# Генерация событий сразу для всего кадра (маски numpy вместо цикла по пикселям)
+def _generate_events_vectorized(state, old_frame, new_frame, prev_t, new_t):
+    (ys, xs), pol, t_cross = _threshold_crossings(
+        state, old_frame, new_frame, prev_t, new_t, np.random
+    )
+
+    # Записываем события в буфер, отсортировав по времени
+    # (устойчиво, как list.sort в цикле)
+    order = np.argsort(t_cross, kind="stable")
+    events = empty_events(order.size)
+    events["t"] = t_cross[order]
+    events["x"] = xs[order]
+    events["y"] = ys[order]
+    events["p"] = pol[order]
     return events
+
+
+
+# Поиск пересечений порога и обновление состояния генератора
+def _threshold_crossings(
+        state,              # состояние генератора (массивы формы (..., H, W))
+        old_frame,          # предыдущие кадры той же формы
+        new_frame,          # новые кадры
+        prev_t,
+        new_t,
+        rng                 # источник случайных смещений (np.random или RandomState)
+):
+    """
+
+    Работает с кадрами любой размерности: последние две оси - (y, x),
+    ведущие оси (если есть) - номер примера.
+    Возвращает кортеж индексов пикселей, полярности и времена событий (без сортировки).
+
+    """
+    # Интервал между кадрами в мс (>0)
+    dt = new_t - prev_t + EPS
+
+    # Пропускаем черные пиксели (важно только перемещение объекта)
+    lit = (old_frame != 0.0) | (new_frame != 0.0)
+
+    # Производная яркости по времени
+    dI_dt = (new_frame - old_frame) / dt
+
+    # Кандидаты на on- и off-события (пороги пересечены в нужную сторону)
+    log_on = np.log((new_frame + EPS) / (state["last_on"] + EPS))
+    log_off = np.log((new_frame + EPS) / (state["last_off"] + EPS))
+    cand_on = lit & (log_on >= LOG_THRESHOLD) & (dI_dt > 0)
+    cand_off = lit & (log_off <= -LOG_THRESHOLD) & (dI_dt < 0)
+
+    # Пиксель не может одновременно стать ярче и темнее, поэтому на каждый пиксель
+    # приходится не больше одного случайного смещения; в цикле они берутся
+    # в порядке обхода кадра, здесь - в том же порядке (построчно)
+    idx = np.nonzero(cand_on | cand_off)
+    pol = cand_on[idx].astype(np.int64)
+    jitter = rng.uniform(0, 5, pol.size)
+
+    # Новые пороги яркости для выбранной полярности
+    last_on = state["last_on"][idx].astype(np.float64)
+    last_off = state["last_off"][idx].astype(np.float64)
+    target = np.where(pol == 1, last_on * EXP_TH, last_off * EXP_MTH)
+
+    # Момент пересечения порога (линейная интерполяция + случайное смещение)
+    old_val = old_frame[idx]
+    t_cross = prev_t + (target - old_val) / (dI_dt[idx] + EPS)
+    t_cross += jitter
+    t_cross = np.clip(t_cross, prev_t, new_t)
+
+    # Событие фиксируется только если рефрактерный период вышел
+    fired = t_cross - state["t_last_event"][idx + (pol,)] >= PIXEL_REF
+    idx = tuple(i[fired] for i in idx)
+    pol, target, t_cross = pol[fired], target[fired], t_cross[fired]
+
+    # Обновляем пороги и время последних событий
+    on, off = pol == 1, pol == 0
+    state["last_on"][tuple(i[on] for i in idx)] = target[on]
+    state["last_off"][tuple(i[off] for i in idx)] = target[off]
+    state["t_last_event"][idx + (pol,)] = t_cross
+
+    return idx, pol, t_cross
+
+
+
+
+# Инициализация состояний генератора событий сразу для нескольких примеров
+def init_event_generator_batch(
+        num_samples,                # количество примеров
+        frame_shape=(28, 28)        # размер изображения (обзор камеры)
+):
+    # Те же массивы, что и в init_event_generator, но с ведущей осью по примерам
+    return init_event_generator(frame_shape=(num_samples, *frame_shape))
+
+
+
+# Генерация событий сразу для всех примеров датасета
+def generate_events_batch(
+        frames,             # кадры всех примеров, np массив (N, T, H, W)
+        dt,                 # время между соседними кадрами (мс)
+        state=None,         # состояние генератора из init_event_generator_batch
+        rng=None            # источник случайных смещений (по умолчанию np.random)
+):
+    """
+
+    Возвращает (events, offsets):
+        events - общий буфер событий всех примеров (core.events),
+                 внутри примера события отсортированы по времени;
+        offsets - матрица (N, T) границ:
+                  события примера n - events[offsets[n, 0]:offsets[n, -1]],
+                  события между кадрами k и k+1 - events[offsets[n, k]:offsets[n, k+1]].
+    Кадр k приходит в момент k * dt.
+
+    """
+    num_samples, num_frames = frames.shape[:2]
+    if state is None:
+        state = init_event_generator_batch(num_samples, frames.shape[2:])
+    if rng is None:
+        rng = np.random
+    # Из одного кадра событий не получить: все границы нулевые
+    if num_frames < 2:
+        return empty_events(0), np.zeros((num_samples, num_frames), dtype=np.int64)
+
+    # Пересечения порогов по интервалам между кадрами
+    chunks = []
+    for k in range(1, num_frames):
+        idx, pol, t_cross = _threshold_crossings(
+            state, frames[:, k - 1], frames[:, k], (k - 1) * dt, k * dt, rng
+        )
+        chunks.append((idx, pol, t_cross, np.full(pol.size, k - 1)))
+
+    sample_id = np.concatenate([c[0][0] for c in chunks])
+    ys = np.concatenate([c[0][1] for c in chunks])
+    xs = np.concatenate([c[0][2] for c in chunks])
+    pol = np.concatenate([c[1] for c in chunks])
+    t_cross = np.concatenate([c[2] for c in chunks])
+    interval = np.concatenate([c[3] for c in chunks])
+
+    # Сортируем по примеру, внутри примера - по времени
+    # (lexsort устойчив, поэтому на границах интервалов порядок интервалов сохраняется)
+    order = np.lexsort((t_cross, sample_id))
+    events = empty_events(order.size)
+    events["t"] = t_cross[order]
+    events["x"] = xs[order]
+    events["y"] = ys[order]
+    events["p"] = pol[order]
+
+    # Границы интервалов: количество событий на (пример, интервал) с накоплением
+    counts = np.bincount(
+        sample_id * (num_frames - 1) + interval,
+        minlength=num_samples * (num_frames - 1)
+    )
+    offsets = np.zeros(num_samples * (num_frames - 1) + 1, dtype=np.int64)
+    np.cumsum(counts, out=offsets[1:])
+    offsets = np.concatenate([
+        offsets[:-1].reshape(num_samples, num_frames - 1),
+        offsets[num_frames - 1::num_frames - 1, None]
+    ], axis=1)
+    return events, offsets
@@ -1,5 +1,5 @@
 import numpy as np
-import core.global_config as cfg
+from core.params import NetworkParams
 
 
 
@@ -7,24 +7,32 @@ import core.global_config as cfg
 def update_weights_stdp(     
         t_post,             # время спайка нейрона
         synapse_weights,    # вектор весов нейрона
-        last_input_times    # вектор, который хранит время активации каждого входа
+        last_input_times,   # вектор, который хранит время активации каждого входа
+        params=None         # гиперпараметры сети (NetworkParams); по умолчанию из global_config
 ):
+    if params is None:
+        params = NetworkParams.from_config()
     # Разница между моментами времени, когда был спайк и когда пришел входной сигнал
     delta_t = t_post - last_input_times
     # Окно времени, в пределах которого можно считать, что входной сигнал пришел незадолго до спайка
-    ltp_mask = (delta_t > 0.0) & (delta_t < cfg.T_LTP)
+    ltp_mask = (delta_t > 0.0) & (delta_t < params.T_LTP)
+
+    # Веса скрытого слоя хранятся по входам, и строка нейрона лежит в памяти с шагом;
+    # считаем в непрерывной копии и записываем строку обратно один раз
+    w = np.array(synapse_weights)
 
     # Вектор коэффициентов усиления связей
-    dw_ltp = cfg.ALPHA_PLUS * np.exp(-cfg.BETA_PLUS * (synapse_weights - cfg.W_MIN) / cfg.W_RANGE)
+    dw_ltp = params.ALPHA_PLUS * np.exp(-params.LTP_SLOPE * (w - params.W_MIN))
     # Вектор коэффициентов ослабления связей
-    dw_ltd = cfg.ALPHA_MINUS * np.exp(-cfg.BETA_MINUS * (cfg.W_MAX - synapse_weights) / cfg.W_RANGE)
+    dw_ltd = params.ALPHA_MINUS * np.exp(-params.LTD_SLOPE * (params.W_MAX - w))
 
     # Если входной сигнал пришел незадолго до того, как нейрон активировался, усиливаем связь
-    synapse_weights +=  ltp_mask * dw_ltp 
+    w +=  ltp_mask * dw_ltp 
     # Иначе ослабляем
-    synapse_weights -= (~ltp_mask) * dw_ltd
+    w -= (~ltp_mask) * dw_ltd
     # Ограничиваем веса в допустимом диапазоне
-    np.clip(synapse_weights, cfg.W_MIN, cfg.W_MAX, out=synapse_weights)
+    np.clip(w, params.W_MIN, params.W_MAX, out=w)
+    synapse_weights[...] = w
 
 
 
@@ -33,7 +41,8 @@ def update_weights_stdp(
 def apply_reward_pstdp(
         weights,                # матрица весов выходного слоя
         eligibility,            # буфер обучаемости
-        reward                  # награда (+1, -1)
+        reward,                 # награда (+1, -1)
+        params=None             # гиперпараметры сети (NetworkParams); по умолчанию из global_config
 ):
     """
     
@@ -45,15 +54,80 @@ def apply_reward_pstdp(
     то веса связей усиливаются уже в настоящей матрице весов, если отрицательная - уменьшаются.
     
     """
-    weights += cfg.OUT_ETA * reward * eligibility
-    np.clip(weights, cfg.W_MIN, cfg.W_MAX, out=weights)
+    if params is None:
+        params = NetworkParams.from_config()
+    weights += reward_pstdp_delta(eligibility, reward, params)
+    np.clip(weights, params.W_MIN, params.W_MAX, out=weights)
 
 
 
+# Изменение весов выходного слоя по награде без применения
+# (например, чтобы сложить изменения нескольких эпизодов, см. train.train_tracker)
+def reward_pstdp_delta(eligibility, reward, params=None):
+    if params is None:
+        params = NetworkParams.from_config()
+    return params.OUT_ETA * reward * eligibility
 
-# Экспоненциальное затухание устаревших значений в eligibility
-def decay_eligibility(
-        eligibility,            # буфер обучаемости
-        dt                      # шаг времени (мс)
-):
-    eligibility *= np.exp(-dt / cfg.OUT_T_ELIG)
\ No newline at end of file
+
+
+
+# Eligibility выходного слоя с ленивым затуханием
+class EligibilityTrace:
+    """
+
+    Значения хранятся приведенными к опорному времени t_ref:
+        eligibility(t) = values * exp(-(t - t_ref) / OUT_T_ELIG),
+    поэтому затухание со временем ничего не стоит, а вклад в момент t
+    записывается с множителем exp((t - t_ref) / OUT_T_ELIG).
+    Так же хранится след пресинаптических спайков pre (exp((last_pre - t_ref) / OUT_T_ELIG)),
+    и постсинаптический спайк добавляет строке ALPHA_MINUS * pre без пересчета экспонент.
+    Когда множитель становится слишком большим, значения приводятся к новому t_ref.
+
+    """
+    __slots__ = ("values", "pre", "t_ref", "inv_tau")
+
+    # Максимальное удаление от t_ref (в единицах OUT_T_ELIG) до переноса опорного времени
+    RENORM_SPAN = 30.0
+
+    def __init__(self, num_post, num_pre, inv_tau):
+        self.values = np.zeros((num_post, num_pre), np.float32)
+        self.pre = np.zeros(num_pre, np.float32)
+        self.t_ref = 0.0
+        self.inv_tau = inv_tau
+
+
+    # Пресинаптический спайк pre_idx в момент t: столбец увеличивается на amount
+    def add_pre(self, pre_idx, t, amount):
+        gain = self._gain(t)
+        self.values[:, pre_idx] += amount * gain
+        self.pre[pre_idx] = gain
+
+
+    # Постсинаптический спайк post_idx (номер или массив) в момент t:
+    # строке добавляется amount * exp(-(t - last_pre) / OUT_T_ELIG)
+    def add_post(self, post_idx, t, amount):
+        self._gain(t)
+        self.values[post_idx, :] += amount * self.pre
+
+
+    # Матрица eligibility в момент t
+    def value(self, t):
+        return self.values * np.float32(np.exp(-(t - self.t_ref) * self.inv_tau))
+
+
+    def clear(self):
+        self.values.fill(0.0)
+        self.pre.fill(0.0)
+        self.t_ref = 0.0
+
+
+    # Множитель для записи в момент t (при необходимости переносим t_ref в t)
+    def _gain(self, t):
+        span = (t - self.t_ref) * self.inv_tau
+        if span > self.RENORM_SPAN:
+            decay = np.float32(np.exp(-span))
+            self.values *= decay
+            self.pre *= decay
+            self.t_ref = t
+            span = 0.0
+        return np.float32(np.exp(span))
@@ -1,5 +1,9 @@
 import numpy as np
 import core.global_config as cfg
+from core.params import NetworkParams
+from core.events import SpikeBuffer
+from core.learning import apply_reward_pstdp, EligibilityTrace
+from core.quantization import weight_scale, quantize_weights, dequantize_weights
 
 """
 
@@ -8,48 +12,107 @@ import core.global_config as cfg
 """
 
 
+# Состояние выходного слоя
+class OutputLayerState:
+    __slots__ = (
+        "params", "u", "last_update", "last_pre", "last_post",
+        "eligibility", "weights", "w_scale", "spikes"
+    )
+
+    def __init__(self, params, weights, w_scale=None):
+        count_output_neurons, count_hidden_neurons = weights.shape
+        # Гиперпараметры сети
+        self.params = params
+        # Вектор потенциалов нейронов выходного слоя
+        self.u = np.zeros(count_output_neurons, np.float32)
+        # Время последнего обновления потенциалов
+        self.last_update = 0.0
+        # Времена пресинаптических спайков
+        self.last_pre = np.full(count_hidden_neurons, -np.inf, np.float32)
+        # Времена постсинаптических спайков
+        self.last_post = np.full(count_output_neurons, -np.inf, np.float32)
+        # Буфер обучаемости связей (затухание ленивое, см. core.learning.EligibilityTrace)
+        self.eligibility = EligibilityTrace(
+            count_output_neurons, count_hidden_neurons, params.OUT_INV_T_ELIG
+        )
+        # Матрица весов связей (строки - выходные нейроны, столбцы - нейроны скрытого слоя)
+        self.weights = weights
+        # Шаг квантования, если weights хранит целые коды (см. core.quantization);
+        # None - веса в float32
+        self.w_scale = w_scale
+        # Спайки выходного слоя: (момент времени, номер нейрона)
+        self.spikes = SpikeBuffer()
+
+
+
 # Инициализация состояния выходного слоя
-def init_output_layer():
+def init_output_layer(
+        params=None,                # гиперпараметры сети (NetworkParams); по умолчанию из global_config
+        weight_dtype=np.float32     # тип весов: float32 или квантованные uint8 / uint16
+):
+    if params is None:
+        params = NetworkParams.from_config()
     # Количество нейронов в скрытом слое (=кол-во входов в выходном)
     count_hidden_neurons = cfg.COUNT_NEURONS
     # Количество нейронов в скрытом слое
     count_output_neurons = cfg.OUT_NEURONS
 
     # Матрица весов 
-    weights = np.clip(
-        np.random.normal(
-            10.0, 2.0, (count_output_neurons, count_hidden_neurons)
-        ),
-        cfg.W_MIN, cfg.W_MAX
-    ).astype(np.float32)
+    weights = _random_weights(params, (count_output_neurons, count_hidden_neurons))
+    w_scale = weight_scale(params, weight_dtype)
+    if w_scale is not None:
+        weights = quantize_weights(weights, params.W_MIN, w_scale, weight_dtype)
 
-    return {
-        # Вектор потенциалов нейронов выходного слоя
-        "u": np.zeros(count_output_neurons, np.float32),
-        # Времена пресинаптических спайков
-        "last_pre": np.full(count_hidden_neurons, -np.inf, np.float32),
-        # Времена постсинаптических спайков
-        "last_post": np.full(count_output_neurons, -np.inf, np.float32),
-        # Буфер обучаемости связей
-        "eligibility": np.zeros((count_output_neurons, count_hidden_neurons), np.float32),
-        # Матрица весов связей (строки - выходные нейроны, столбцы - нейроны скрытого слоя)
-        "weights": weights
-    }
+    return OutputLayerState(params, weights, w_scale)
 
 
 
 # Сброс состояния выходного слоя
-def reset_output_layer(state):
-    state["u"].fill(0.0)
-    state["last_pre"].fill(-np.inf)
-    state["last_post"].fill(-np.inf)
-    state["eligibility"].fill(0.0)
-    state["weights"] = np.clip(
-        np.random.normal(
-            10.0, 2.0, state["weights"].shape
-        ),
-        cfg.W_MIN, cfg.W_MAX
-    ).astype(np.float32)
+def reset_output_layer(
+        state,
+        reset_weights=True      # если False, обученные веса сохраняются (сбрасывается только динамика)
+):
+    state.u.fill(0.0)
+    state.last_update = 0.0
+    state.spikes.clear()
+    state.last_pre.fill(-np.inf)
+    state.last_post.fill(-np.inf)
+    state.eligibility.clear()
+    if not reset_weights:
+        return
+    weights = _random_weights(state.params, state.weights.shape)
+    if state.w_scale is not None:
+        weights = quantize_weights(weights, state.params.W_MIN, state.w_scale, state.weights.dtype)
+    state.weights = weights
+
+
+
+# Матрица весов в float32 (с учетом квантования)
+def output_weights(state):
+    if state.w_scale is None:
+        return state.weights
+    return dequantize_weights(state.weights, state.params.W_MIN, state.w_scale)
+
+
+
+# Применение награды к весам по накопленному eligibility (p-STDP)
+def output_apply_reward(
+        state,
+        reward,             # награда (+1, -1)
+        t=None              # момент награды (мс); по умолчанию время последнего обновления слоя
+):
+    if t is None:
+        t = state.last_update
+    eligibility = state.eligibility.value(t)
+    if state.w_scale is None:
+        apply_reward_pstdp(state.weights, eligibility, reward, state.params)
+        return
+    # Квантованные веса: обновляем значения и записываем коды со стохастическим округлением
+    weights = output_weights(state)
+    apply_reward_pstdp(weights, eligibility, reward, state.params)
+    state.weights = quantize_weights(
+        weights, state.params.W_MIN, state.w_scale, state.weights.dtype
+    )
 
 
 
@@ -59,29 +122,73 @@ def output_pre_spike(
         pre_idx,            # индекс пресинаптического нейрона
         t                   # время спайка (мс)
 ):
-    # Проходим по всем нейронам выходного слоя
-    for neuron_idx in range(cfg.OUT_NEURONS):
-        # Запоминаем, что нейрон скрытого слоя pre_idx мог оказать влияние
-        # на активацию текущего нейрона выходного слоя neuron_idx
-        state["eligibility"][neuron_idx, pre_idx] += cfg.ALPHA_PLUS
+    # Запоминаем, что нейрон скрытого слоя pre_idx мог оказать влияние
+    # на активацию каждого нейрона выходного слоя (столбец eligibility)
+    state.eligibility.add_pre(pre_idx, t, state.params.ALPHA_PLUS)
     # Обновляем время последней активации пресинаптического нейрона скрытого слоя
-    state["last_pre"][pre_idx] = t
+    state.last_pre[pre_idx] = t
 
 
 
 # Обработка спайка выходного нейрона
 def output_post_spike(
         state, 
-        post_idx,           # индекс постсинаптического нейрона
+        post_idx,           # индекс постсинаптического нейрона (или массив индексов)
         t                   # время спайка (мс)
 ):
-    # Вычисляем разницу времени между спайком постсинаптического нейрона (нейрон выходного слоя)
-    # и спайками пресинаптических нейронов (нейронов скрытого слоя)
-    dt = t - state["last_pre"]
-    # Вычисляем вектор коэффициентов усиления связей:
-    # если пресинаптический спайк был давно, то gain_ratio -> 0
-    # иначе gain_ratio -> 1
-    gain_ratio = np.exp(-dt / cfg.OUT_T_ELIG)
-    state["eligibility"][post_idx, :] += cfg.ALPHA_MINUS * gain_ratio
+    # Коэффициенты усиления связей exp(-(t - last_pre) / OUT_T_ELIG):
+    # если пресинаптический спайк был давно, то коэффициент -> 0, иначе -> 1;
+    # берутся из следа пресинаптических спайков в state.eligibility
+    state.eligibility.add_post(post_idx, t, state.params.ALPHA_MINUS)
     # Обновляем время последней активации постсинаптического нейрона выходного слоя
-    state["last_post"][post_idx] = t
+    state.last_post[post_idx] = t
+
+
+
+# Обработка спайков скрытого слоя (массивы времен и номеров нейронов, по возрастанию времени)
+def output_layer_run(
+        state,              # состояние выходного слоя (OutputLayerState)
+        times,              # времена спайков скрытого слоя (мс)
+        neurons             # номера сработавших нейронов скрытого слоя
+):
+    """
+
+    LIF-нейроны выходного слоя: между спайками потенциалы затухают с OUT_TAU_LEAK,
+    спайк скрытого нейрона j добавляет столбец весов weights[:, j] нейронам
+    вне рефрактерного периода OUT_T_REF. Нейроны, превысившие OUT_I_THRES,
+    дают спайк (state.spikes), сбрасывают потенциал и обновляют свои строки eligibility.
+    Например, для спайков скрытого слоя за интервал:
+        output_layer_run(out, hidden.spikes.times, hidden.spikes.neurons)
+
+    """
+    params = state.params
+    # Веса не меняются во время прогона (обучение - по награде, output_apply_reward)
+    weights = output_weights(state)
+    for t, pre_idx in zip(np.asarray(times).tolist(), np.asarray(neurons).tolist()):
+        # Экспоненциальное затухание потенциалов
+        dt = t - state.last_update
+        if dt > 0:
+            state.u *= np.exp(-dt * params.OUT_INV_TAU_LEAK)
+            state.last_update = t
+
+        # Вклад получают нейроны вне рефрактерного периода
+        mask_active = t >= state.last_post + params.OUT_T_REF
+        state.u[mask_active] += weights[mask_active, pre_idx]
+        output_pre_spike(state, pre_idx, t)
+
+        # Спайки всех нейронов, превысивших порог
+        fired = np.flatnonzero(state.u > params.OUT_I_THRES)
+        if fired.size > 0:
+            for post_idx in fired.tolist():
+                state.spikes.append(t, post_idx)
+            state.u[fired] = 0.0
+            output_post_spike(state, fired, t)
+
+
+
+# Случайные начальные веса
+def _random_weights(params, shape):
+    return np.clip(
+        np.random.normal(10.0, 2.0, shape),
+        params.W_MIN, params.W_MAX
+    ).astype(np.float32)
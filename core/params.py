@@ -0,0 +1,86 @@
+from dataclasses import dataclass, field, fields, replace
+import core.global_config as cfg
+
+
+"""
+
+Гиперпараметры одной сети (скрытый и выходной слои).
+Объект неизменяемый: каждая сеть получает свой экземпляр при инициализации,
+поэтому несколько сетей с разными параметрами могут работать одновременно
+(в потоках или пакетом), не меняя core.global_config.
+
+"""
+
+
+@dataclass(frozen=True)
+class NetworkParams:
+    # Параметры LIF-нейронов скрытого слоя
+    TAU_LEAK: float
+    I_THRES: float
+    T_REF: float
+    T_INHIBIT: float
+
+    # Константы STDP
+    ALPHA_PLUS: float
+    ALPHA_MINUS: float
+    BETA_PLUS: float
+    BETA_MINUS: float
+    T_LTP: float
+
+    # Начальные веса
+    W_INIT_MEAN: float
+    W_INIT_STD: float
+    W_MIN: float
+    W_MAX: float
+
+    # Выходной слой
+    OUT_TAU_LEAK: float
+    OUT_I_THRES: float
+    OUT_T_REF: float
+    OUT_T_ELIG: float
+    OUT_ETA: float
+
+    # Производные константы (считаются один раз при создании)
+    W_RANGE: float = field(init=False)
+    INV_TAU_LEAK: float = field(init=False)          # 1 / TAU_LEAK
+    LTP_SLOPE: float = field(init=False)             # BETA_PLUS / W_RANGE
+    LTD_SLOPE: float = field(init=False)             # BETA_MINUS / W_RANGE
+    OUT_INV_TAU_LEAK: float = field(init=False)      # 1 / OUT_TAU_LEAK
+    OUT_INV_T_ELIG: float = field(init=False)        # 1 / OUT_T_ELIG
+
+    def __post_init__(self):
+        w_range = self.W_MAX - self.W_MIN
+        derived = {
+            "W_RANGE": w_range,
+            "INV_TAU_LEAK": 1.0 / self.TAU_LEAK,
+            "LTP_SLOPE": self.BETA_PLUS / w_range,
+            "LTD_SLOPE": self.BETA_MINUS / w_range,
+            "OUT_INV_TAU_LEAK": 1.0 / self.OUT_TAU_LEAK,
+            "OUT_INV_T_ELIG": 1.0 / self.OUT_T_ELIG
+        }
+        for key, val in derived.items():
+            object.__setattr__(self, key, val)
+
+
+    # Параметры из core.global_config (значения на момент вызова)
+    @classmethod
+    def from_config(cls):
+        return cls(**{name: getattr(cfg, name) for name in _input_fields()})
+
+
+    # Параметры из словаря (например, из genetic.operators.generate_params);
+    # отсутствующие ключи берутся из core.global_config
+    @classmethod
+    def from_dict(cls, params):
+        return replace(cls.from_config(), **params)
+
+
+    # Словарь входных параметров (без производных)
+    def to_dict(self):
+        return {name: getattr(self, name) for name in _input_fields()}
+
+
+
+# Имена параметров, которые задаются при создании
+def _input_fields():
+    return [f.name for f in fields(NetworkParams) if f.init]
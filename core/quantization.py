@@ -0,0 +1,49 @@
+import numpy as np
+
+
+"""
+
+Квантованные веса: целые коды uint8 / uint16 с фиксированной точкой
+в диапазоне [W_MIN, W_MAX]:
+    w = W_MIN + scale * q,  scale = W_RANGE / max(q)
+Изменения STDP обычно меньше шага квантования, поэтому при записи
+используется стохастическое округление: в среднем вес меняется
+ровно на величину, посчитанную правилом обучения.
+
+"""
+
+
+# Допустимые типы кодов
+QUANT_DTYPES = (np.uint8, np.uint16)
+
+
+
+# Шаг квантования для типа dtype (None - веса хранятся в float32)
+def weight_scale(params, dtype):
+    dtype = np.dtype(dtype)
+    if dtype == np.float32:
+        return None
+    if dtype not in QUANT_DTYPES:
+        raise ValueError(f"Неподдерживаемый тип весов {dtype}")
+    return params.W_RANGE / np.iinfo(dtype).max
+
+
+
+# Веса -> коды со стохастическим округлением
+def quantize_weights(
+        weights,        # веса (float)
+        w_min,          # нижняя граница весов (W_MIN)
+        scale,          # шаг квантования (weight_scale)
+        dtype,          # тип кодов (uint8 / uint16)
+        rng=np.random   # генератор случайных чисел
+):
+    codes = (np.asarray(weights, np.float64) - w_min) / scale
+    # Округление вверх с вероятностью, равной дробной части
+    codes = np.floor(codes + rng.uniform(0.0, 1.0, codes.shape))
+    return np.clip(codes, 0, np.iinfo(dtype).max).astype(dtype)
+
+
+
+# Коды -> веса float32
+def dequantize_weights(codes, w_min, scale):
+    return codes.astype(np.float32) * np.float32(scale) + np.float32(w_min)
@@ -0,0 +1,75 @@
+import os
+import random
+import numpy as np
+
+import genetic.ga_config as ga
+from utils.data_converter import save_pickle, load_pickle
+from .fitness_cache import TRAINING_CONSTANTS, dataset_hash
+
+
+"""
+
+Контрольные точки genetic_search: популяция с оценками, номер следующего поколения,
+состояния генераторов random и numpy и статистика запуска.
+Файл записывается атомарно (utils.data_converter.save_pickle), поэтому при обрыве
+процесса остается предыдущая целая контрольная точка. После восстановления состояний
+генераторов поиск продолжается так же, как шел бы без остановки
+(оценки особей зависят только от их параметров, см. operators.params_seed).
+
+"""
+
+
+# Настройки ga_config, которые должны совпадать при продолжении поиска
+# (вместе с настройками обучения fitness_cache.TRAINING_CONSTANTS и датасетом)
+CHECKPOINT_CONSTANTS = (
+    "POP_SIZE", "GENERATIONS", "NUM_BEST_INDIV", "MUTATION_PROB", "POPULATION_PARALLEL",
+    "SUCCESSIVE_HALVING", "HALVING_RUNGS", "HALVING_ETA"
+) + TRAINING_CONSTANTS
+
+
+
+
+# Запись контрольной точки
+def save_checkpoint(
+        path,               # файл .pkl
+        generation,         # номер следующего поколения
+        population,         # отсортированный список (anti_selectivity_score, params)
+        evaluations=0,      # сколько оценок сделано с начала поиска
+        seconds=0.0         # сколько секунд шел поиск
+):
+    save_pickle(path, {
+        "generation": generation,
+        "population": population,
+        "random_state": random.getstate(),
+        "numpy_state": np.random.get_state(),
+        "evaluations": evaluations,
+        "seconds": seconds,
+        "config": _config()
+    })
+
+
+
+# Загрузка контрольной точки и восстановление состояний генераторов (None, если файла нет)
+def load_checkpoint(path):
+    if not os.path.exists(path):
+        return None
+    checkpoint = load_pickle(path)
+    config = _config()
+    saved = checkpoint.get("config", {})
+    changed = sorted(name for name in config if saved.get(name) != config[name])
+    if changed:
+        raise ValueError(
+            f"Контрольная точка {path} записана с другими настройками ГА: " +
+            ", ".join(f"{name}={saved.get(name)!r} (сейчас {config[name]!r})" for name in changed)
+        )
+    random.setstate(checkpoint["random_state"])
+    np.random.set_state(checkpoint["numpy_state"])
+    return checkpoint
+
+
+
+# Настройки, с которыми записывается контрольная точка
+def _config():
+    config = {name: getattr(ga, name) for name in CHECKPOINT_CONSTANTS}
+    config["DATASET"] = dataset_hash(ga.DATASET)
+    return config
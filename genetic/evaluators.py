@@ -0,0 +1,247 @@
+import os
+import math
+from itertools import repeat
+import numpy as np
+from concurrent.futures import ProcessPoolExecutor, Future
+from multiprocessing import shared_memory
+
+import genetic.ga_config as ga
+from utils.data_converter import load_event_store, event_store_from_arrays
+from .train_snn import (
+    evaluate_selectivity,
+    evaluate_selectivity_population,
+    dataset_events,
+    dataset_event_buffer
+)
+
+
+"""
+
+Оценка списка особей: метод evaluate(params_list) возвращает тройки
+(anti_selectivity_score, spike_matrix, abort_reason) в порядке params_list;
+sample_indices и epochs задают оценку на части датасета (см. train_snn.evaluate_selectivity).
+Метод submit(params) оценивает одну особь и возвращает concurrent.futures.Future
+(для асинхронного ГА, main_ga.steady_state_search); workers - сколько оценок идет одновременно.
+События датасета генерируются один раз (train_snn.dataset_events или хранилище
+utils.data_converter на диске) и используются всеми особями и эпохами.
+
+SerialEvaluator - оценка в текущем процессе.
+ProcessPoolEvaluator - оценка в пуле процессов. События датасета генерируются один раз
+в основном процессе и копируются в общую память (multiprocessing.shared_memory):
+буфер core.events и границы интервалов; рабочие процессы подключаются к ней при запуске.
+С хранилищем на диске процессы отображают его файлы в память только для чтения.
+В задачу передается только словарь параметров. Зерно каждой оценки
+зависит только от параметров (operators.params_seed), поэтому результат
+не зависит от количества процессов и порядка выполнения задач.
+При ga.POPULATION_PARALLEL каждый процесс обучает свою группу подряд идущих особей
+одновременно (train_snn.evaluate_selectivity_population). Зерно такой оценки зависит
+от всей группы, поэтому результат зависит от количества процессов и совпадает
+с SerialEvaluator только при workers=1.
+
+"""
+
+
+# Состояние рабочего процесса (задается в _init_worker)
+_shm = []
+_samples = None
+_event_store = None
+_distr_penalty = None
+
+
+
+
+class SerialEvaluator:
+    def __init__(
+        self,
+        dataset,                # датасет (список словарей с "frames" и "direction")
+        distr_penalty=0.3,      # вес штрафа за неравномерное распределение (evaluate_selectivity)
+        event_store=None        # события датасета (по умолчанию генерируются здесь один раз)
+    ):
+        self.dataset = dataset
+        self.distr_penalty = distr_penalty
+        self.event_store = dataset_events(dataset) if event_store is None else event_store
+        self.workers = 1
+
+
+    def evaluate(self, params_list, sample_indices=None, epochs=None):
+        if not params_list:
+            return []
+        # Все сети одновременно на общем потоке событий (см. ga.POPULATION_PARALLEL)
+        if ga.POPULATION_PARALLEL:
+            return evaluate_selectivity_population(
+                params_list=params_list,
+                distr_penalty=self.distr_penalty,
+                dataset=self.dataset,
+                event_store=self.event_store,
+                sample_indices=sample_indices,
+                epochs=epochs
+            )
+        return [
+            evaluate_selectivity(
+                params=params,
+                distr_penalty=self.distr_penalty,
+                dataset=self.dataset,
+                event_store=self.event_store,
+                sample_indices=sample_indices,
+                epochs=epochs
+            )
+            for params in params_list
+        ]
+
+
+    # Оценка выполняется сразу, возвращается уже завершенный Future
+    def submit(self, params):
+        future = Future()
+        future.set_result(self.evaluate([params])[0])
+        return future
+
+
+    def close(self):
+        pass
+
+
+    def __enter__(self):
+        return self
+
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+
+
+# Копия массива в общей памяти: блок и его описание (имя, форма, тип) для рабочих процессов
+def _share(array):
+    shm = shared_memory.SharedMemory(create=True, size=max(array.nbytes, 1))
+    np.ndarray(array.shape, dtype=array.dtype, buffer=shm.buf)[...] = array
+    return shm, (shm.name, array.shape, array.dtype)
+
+
+
+# Подключение к массиву в общей памяти (только для чтения)
+def _attach(name, shape, dtype):
+    shm = shared_memory.SharedMemory(name=name)
+    array = np.ndarray(shape, dtype=dtype, buffer=shm.buf)
+    array.flags.writeable = False
+    _shm.append(shm)
+    return array
+
+
+
+# Подключение рабочего процесса к событиям датасета
+def _init_worker(shared_events, samples, distr_penalty, event_store_dir):
+    global _samples, _event_store, _distr_penalty
+    _samples = samples
+    _distr_penalty = distr_penalty
+    # Хранилище на диске отображается в память только для чтения (страницы общие для всех процессов);
+    # без него - буфер событий и границы интервалов из общей памяти
+    if event_store_dir is not None:
+        _event_store = load_event_store(event_store_dir)
+    else:
+        events, offsets = (_attach(*shared) for shared in shared_events)
+        _event_store = event_store_from_arrays(events, offsets)
+
+
+
+# Оценка одной особи в рабочем процессе
+def _evaluate(params, sample_indices=None, epochs=None):
+    return evaluate_selectivity(
+        params=params,
+        distr_penalty=_distr_penalty,
+        dataset=_samples,
+        event_store=_event_store,
+        sample_indices=sample_indices,
+        epochs=epochs
+    )
+
+
+# Оценка группы особей одновременно (ga.POPULATION_PARALLEL) в рабочем процессе
+def _evaluate_population(params_list, sample_indices=None, epochs=None):
+    return evaluate_selectivity_population(
+        params_list=params_list,
+        distr_penalty=_distr_penalty,
+        dataset=_samples,
+        event_store=_event_store,
+        sample_indices=sample_indices,
+        epochs=epochs
+    )
+
+
+
+# Оценка одной особи как популяции из одной сети (как SerialEvaluator.submit)
+def _evaluate_single_population(params, sample_indices=None, epochs=None):
+    return _evaluate_population([params], sample_indices, epochs)[0]
+
+
+
+
+class ProcessPoolEvaluator:
+    def __init__(
+        self,
+        dataset,                # датасет (список словарей с "frames" и "direction")
+        workers=None,           # количество процессов (по умолчанию - количество ядер)
+        distr_penalty=0.3,      # вес штрафа за неравномерное распределение (evaluate_selectivity)
+        event_store_dir=None    # каталог хранилища событий датасета (None - события в общей памяти)
+    ):
+        self.workers = workers or os.cpu_count()
+
+        # Без хранилища на диске события генерируются здесь один раз и копируются в общую память
+        self._shm = []
+        shared_events = None
+        if event_store_dir is None:
+            shared_events = []
+            for array in dataset_event_buffer(dataset):
+                shm, shared = _share(array)
+                self._shm.append(shm)
+                shared_events.append(shared)
+        # Остальные поля примеров (без кадров) передаются процессам один раз
+        samples = [
+            {key: val for key, val in sample.items() if key != "frames"}
+            for sample in dataset
+        ]
+
+        self._pool = ProcessPoolExecutor(
+            max_workers=self.workers,
+            initializer=_init_worker,
+            initargs=(shared_events, samples, distr_penalty, event_store_dir)
+        )
+
+
+    def evaluate(self, params_list, sample_indices=None, epochs=None):
+        if not params_list:
+            return []
+        # По одной группе подряд идущих особей на процесс (см. ga.POPULATION_PARALLEL)
+        if ga.POPULATION_PARALLEL:
+            size = math.ceil(len(params_list) / self.workers)
+            groups = [params_list[i:i + size] for i in range(0, len(params_list), size)]
+            results = self._pool.map(
+                _evaluate_population, groups, repeat(sample_indices), repeat(epochs)
+            )
+            return [result for group in results for result in group]
+        return list(self._pool.map(_evaluate, params_list, repeat(sample_indices), repeat(epochs)))
+
+
+    def submit(self, params):
+        if ga.POPULATION_PARALLEL:
+            return self._pool.submit(_evaluate_single_population, params)
+        return self._pool.submit(_evaluate, params)
+
+
+    # Остановка процессов и освобождение общей памяти
+    def close(self):
+        if self._pool is None:
+            return
+        self._pool.shutdown()
+        self._pool = None
+        for shm in self._shm:
+            shm.close()
+            shm.unlink()
+        self._shm = []
+
+
+    def __enter__(self):
+        return self
+
+
+    def __exit__(self, *exc):
+        self.close()
@@ -0,0 +1,138 @@
+import os
+import hashlib
+import numpy as np
+
+import core.global_config as cfg
+import core.input_layer as il
+import genetic.ga_config as ga
+from .operators import canonical_params, params_seed
+
+
+"""
+
+Кэш оценок особей на диске: по файлу .npz (оценка, spike_matrix и причина ранней остановки)
+на набор параметров.
+Ключ - хэш канонического словаря параметров, датасета, настроек обучения ga_config,
+констант core.global_config и входного слоя, веса штрафа и зерна оценки,
+поэтому изменение любого из них дает новый ключ, а старые записи просто не используются.
+Размер кэша ограничен: при переполнении удаляются записи, к которым дольше всего
+не обращались (время последнего обращения - время изменения файла).
+
+"""
+
+
+# Настройки обучения ga_config, от которых зависит результат evaluate_selectivity
+TRAINING_CONSTANTS = (
+    "EPOCHS", "MIN_SPIKES_FOR_ACTIVE", "AVERAGE_EV_PER_FRAME", "MAX_SPIKES_PER_SAMPLE",
+    "NUM_INACTIVE_SAMPLES", "HOMEO_DOWN", "HOMEO_UP", "EVENT_SEED",
+    "EARLY_ABORT", "ABORT_SAMPLES", "ABORT_SPIKES_PER_EVENT", "CHUNKED_RUN"
+)
+
+
+
+
+# Хэш датасета: кадры и направления всех примеров
+def dataset_hash(dataset):
+    h = hashlib.sha1()
+    for sample in dataset:
+        h.update(np.ascontiguousarray(sample["frames"], dtype=np.float32).tobytes())
+        h.update(repr(tuple(sample["direction"])).encode())
+    return h.hexdigest()
+
+
+
+# Константы, от которых зависит оценка, кроме параметров особи (строка для хэширования)
+def _context(dataset, distr_penalty):
+    core_constants = sorted(
+        (name, val) for name, val in vars(cfg).items()
+        if name.isupper() and isinstance(val, (int, float, str))
+    )
+    return repr((
+        dataset_hash(dataset),
+        [(name, getattr(ga, name)) for name in TRAINING_CONSTANTS],
+        core_constants,
+        (il.LOG_THRESHOLD, il.PIXEL_REF),
+        float(distr_penalty)
+    ))
+
+
+
+
+class FitnessCache:
+    def __init__(
+        self,
+        dataset,                            # датасет, на котором оцениваются особи
+        cache_dir="data/fitness_cache",     # каталог кэша
+        max_entries=10000,                  # максимальное количество записей
+        distr_penalty=0.3                   # вес штрафа (evaluate_selectivity)
+    ):
+        self.cache_dir = cache_dir
+        self.max_entries = max_entries
+        self._context = _context(dataset, distr_penalty)
+        self.hits = 0
+        self.misses = 0
+        os.makedirs(cache_dir, exist_ok=True)
+
+
+    # Ключ записи для набора параметров
+    def key(self, params):
+        h = hashlib.sha1()
+        h.update(self._context.encode())
+        h.update(canonical_params(params).encode())
+        h.update(str(params_seed(params)).encode())
+        return h.hexdigest()
+
+
+    # Сохраненная оценка (anti_selectivity_score, spike_matrix, abort_reason) или None
+    def get(self, params):
+        path = self._path(params)
+        try:
+            with np.load(path) as data:
+                result = (
+                    float(data["score"]),
+                    data["spike_matrix"],
+                    str(data["abort_reason"]) or None
+                )
+            # Отмечаем обращение (для вытеснения давно не используемых записей);
+            # если другой процесс уже удалил запись, прочитанная оценка все равно верна
+            try:
+                os.utime(path)
+            except OSError:
+                pass
+        except (FileNotFoundError, OSError, KeyError, ValueError):
+            self.misses += 1
+            return None
+        self.hits += 1
+        return result
+
+
+    # Запись оценки
+    def put(self, params, result):
+        score, spike_matrix, abort_reason = result
+        path = self._path(params)
+        # Пишем во временный файл и переименовываем, чтобы не прочитать недописанную запись
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, "wb") as f:
+            np.savez(f, score=score, spike_matrix=spike_matrix, abort_reason=abort_reason or "")
+        os.replace(tmp_path, path)
+        self._evict()
+
+
+    # Удаление записей, к которым дольше всего не обращались, сверх max_entries
+    def _evict(self):
+        entries = [
+            entry for entry in os.scandir(self.cache_dir)
+            if entry.name.endswith(".npz")
+        ]
+        if len(entries) <= self.max_entries:
+            return
+        entries.sort(key=lambda entry: entry.stat().st_mtime)
+        for entry in entries[:len(entries) - self.max_entries]:
+            try:
+                os.remove(entry.path)
+            except FileNotFoundError:
+                pass
+
+
+    def _path(self, params):
+        return os.path.join(self.cache_dir, self.key(params) + ".npz")
@@ -15,6 +15,31 @@ BEST_RATE = 0.15
 NUM_BEST_INDIV = max(1, int(BEST_RATE * POP_SIZE))
 # Вероятность мутации каждого параметра при формировании следующего поколения
 MUTATION_PROB = 0.25
+# Если True, все особи поколения обучаются одновременно на общем потоке событий
+# (при NUM_WORKERS > 1 - по группе особей на процесс)
+POPULATION_PARALLEL = False
+# Количество процессов для оценки особей (1 - последовательно в текущем процессе,
+# None - по числу ядер); см. genetic.evaluators
+NUM_WORKERS = 1
+# Каталог кэша оценок особей на диске (None - без кэша); см. genetic.fitness_cache
+FITNESS_CACHE_DIR = None
+# Максимальное количество записей в кэше оценок
+FITNESS_CACHE_SIZE = 10000
+# События датасета генерируются один раз за запуск с этим зерном случайных смещений времени
+# и используются всеми особями и эпохами
+EVENT_SEED = 0
+# Каталог хранилища событий на диске (None - события держатся в памяти); см. utils.data_converter
+EVENT_STORE_DIR = None
+# Оценка поколения последовательным отсевом (см. genetic.successive_halving)
+SUCCESSIVE_HALVING = False
+# Ступени отсева: (доля примеров каждой группы направление + стиль, количество эпох)
+HALVING_RUNGS = ((0.125, 1), (0.25, 1))
+# На следующую ступень проходит 1/HALVING_ETA особей
+HALVING_ETA = 3
+# Файл контрольной точки genetic_search (None - без контрольных точек); см. genetic.checkpoint
+CHECKPOINT_PATH = None
+# Через сколько поколений записывать контрольную точку
+CHECKPOINT_EVERY = 1
 
 
 """Тренировочные данные"""
@@ -48,4 +73,13 @@ NUM_INACTIVE_SAMPLES = 8
 HOMEO_DOWN = 0.9
 # Коэффициент увеличения порога для слишком активных нейронов
 HOMEO_UP = 1.1
+# Ранняя остановка оценки безнадежных сетей (см. train_snn.AbortMonitor)
+EARLY_ABORT = False
+# Сколько примеров подряд должно выполняться условие остановки
+ABORT_SAMPLES = 50
+# Спайков скрытого слоя на входное событие, выше которых сеть считается неуправляемой
+ABORT_SPIKES_PER_EVENT = 0.5
+# Блочная обработка событий (core.hidden_layer.hidden_layer_run): быстрее,
+# но спайки и оценки не совпадают с пособытийной (hidden_layer_step)
+CHUNKED_RUN = False
 
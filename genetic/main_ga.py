@@ -1,13 +1,20 @@
+import time
 import random
+from concurrent.futures import wait, FIRST_COMPLETED
 import genetic.ga_config as ga
 from .operators import (
     generate_params,
     mix_params,
     mutate_params,
-    candidate_selection
+    candidate_selection,
+    canonical_params
 )
-from .train_snn import evaluate_selectivity
-from core.global_config import COUNT_NEURONS
+from .evaluators import SerialEvaluator, ProcessPoolEvaluator
+from .fitness_cache import FitnessCache
+from .successive_halving import SuccessiveHalving
+from .checkpoint import save_checkpoint, load_checkpoint
+from core.global_config import COUNT_NEURONS, FRAME_DT_MS
+from utils.data_converter import stack_frames, load_or_generate_events, load_event_store, event_store_path
 from utils.visualization import plot_direction_heatmap
 
 
@@ -16,21 +23,118 @@ random.seed(42)
 
 
 
+# Хранилище событий датасета на диске (создается при первом запуске);
+# None, если ga.EVENT_STORE_DIR не задан
+def make_event_store_dir():
+    if ga.EVENT_STORE_DIR is None:
+        return None
+    frames = stack_frames(ga.DATASET)
+    load_or_generate_events(frames, FRAME_DT_MS, seed=ga.EVENT_SEED, cache_dir=ga.EVENT_STORE_DIR)
+    return event_store_path(frames, FRAME_DT_MS, seed=ga.EVENT_SEED, cache_dir=ga.EVENT_STORE_DIR)
+
+
+
+# Оценка особей в текущем процессе или в пуле процессов (если ga.NUM_WORKERS != 1);
+# события датасета готовятся один раз на весь запуск ГА
+def make_evaluator():
+    event_store_dir = make_event_store_dir()
+    if ga.NUM_WORKERS == 1:
+        event_store = None if event_store_dir is None else load_event_store(event_store_dir)
+        return SerialEvaluator(ga.DATASET, distr_penalty=0.3, event_store=event_store)
+    return ProcessPoolEvaluator(
+        ga.DATASET,
+        workers=ga.NUM_WORKERS,
+        distr_penalty=0.3,
+        event_store_dir=event_store_dir
+    )
+
+
+
+# Кэш оценок на диске (None, если ga.FITNESS_CACHE_DIR не задан)
+def make_cache():
+    if ga.FITNESS_CACHE_DIR is None:
+        return None
+    return FitnessCache(
+        ga.DATASET,
+        cache_dir=ga.FITNESS_CACHE_DIR,
+        max_entries=ga.FITNESS_CACHE_SIZE,
+        distr_penalty=0.3
+    )
+
+
+
+# Последовательный отсев при оценке поколения (None, если ga.SUCCESSIVE_HALVING выключен)
+def make_halving():
+    if not ga.SUCCESSIVE_HALVING:
+        return None
+    return SuccessiveHalving(ga.DATASET, rungs=ga.HALVING_RUNGS, eta=ga.HALVING_ETA, distr_penalty=0.3)
+
+
+
+# Обучение скрытого слоя на каждом наборе параметров и оценка качества
+def evaluate_population(
+        params_list,
+        evaluator=None,         # SerialEvaluator / ProcessPoolEvaluator (None - новый SerialEvaluator)
+        cache=None,             # FitnessCache (None - без кэша)
+        halving=None            # SuccessiveHalving (None - все особи оцениваются на всем датасете)
+):
+    """
+
+    Возвращает список (anti_selectivity_score, spike_matrix, abort_reason) в порядке params_list
+    (abort_reason - причина ранней остановки оценки, train_snn.ABORT_REASONS, или None).
+    Оценки из кэша не пересчитываются, одинаковые наборы в params_list оцениваются один раз.
+    Результат популяционного режима (ga.POPULATION_PARALLEL) зависит от состава популяции,
+    поэтому в этом режиме кэш не используется.
+    С halving в кэш попадают только итоговые оценки на всем датасете.
+
+    """
+    if evaluator is None:
+        evaluator = SerialEvaluator(ga.DATASET, distr_penalty=0.3)
+    if halving is not None:
+        return halving.evaluate(
+            params_list,
+            evaluator,
+            final=lambda finalists: evaluate_population(finalists, evaluator, cache)
+        )
+    if cache is None or ga.POPULATION_PARALLEL:
+        return evaluator.evaluate(params_list)
+
+    results = [cache.get(params) for params in params_list]
+    # Уникальные наборы параметров, которых нет в кэше
+    missing = {}
+    for params, result in zip(params_list, results):
+        if result is None:
+            missing.setdefault(canonical_params(params), params)
+    new_results = dict(zip(missing, evaluator.evaluate(list(missing.values()))))
+    for key, params in missing.items():
+        cache.put(params, new_results[key])
+    return [
+        result if result is not None else new_results[canonical_params(params)]
+        for params, result in zip(params_list, results)
+    ]
+
+
+
+# Пометка о ранней остановке оценки для вывода
+def _abort_note(abort_reason):
+    return "" if abort_reason is None else f" (оценка остановлена: {abort_reason})"
+
+
+
 # Формирование первого поколения
-def init_population():
+def init_population(evaluator=None, cache=None, halving=None):
     population = []
     print(f"### Поколение 1/{ga.GENERATIONS} ###")
-    for num_child in range(ga.POP_SIZE):
-        # Генерируем набор параметров
-        params = generate_params()
-        # Обучаем скрытый слой на этом наборе и оцениваем качество
-        anti_selectivity_score, spike_matrix = evaluate_selectivity(
-            params=params,
-            distr_penalty=0.3,
-            dataset=ga.DATASET
-        )
+    # Генерируем наборы параметров
+    params_list = [generate_params() for _ in range(ga.POP_SIZE)]
+    # Обучаем скрытый слой на каждом наборе и оцениваем качество
+    results = evaluate_population(params_list, evaluator, cache, halving)
+    for num_child, (params, (anti_selectivity_score, spike_matrix, abort_reason)) in enumerate(zip(params_list, results)):
         population.append((anti_selectivity_score, params))
-        print(f"\tИндивид {num_child+1}/{ga.POP_SIZE}: anti_selectivity_score = {anti_selectivity_score}")
+        print(
+            f"\tИндивид {num_child+1}/{ga.POP_SIZE}: anti_selectivity_score = {anti_selectivity_score}"
+            f"{_abort_note(abort_reason)}"
+        )
         ##### Визуализация и запись нужны только для отладки #####
         spikes_count_by_dir = {}
         for dir_idx, direction in enumerate(ga.DIR2IDX.keys()):
@@ -43,41 +147,64 @@ def init_population():
 
 
 
-# Главная функция ГА
-def genetic_search():
-    # Формируем первое поколение
-    cur_population = init_population()
+# Главная функция ГА; возвращает лучшую оценку, лучшие параметры и статистику запуска
+def genetic_search(
+        resume=False    # продолжить с контрольной точки ga.CHECKPOINT_PATH, если она есть
+):
+    """
+
+    Каждые ga.CHECKPOINT_EVERY поколений записывается контрольная точка (genetic.checkpoint).
+    При resume=True поиск продолжается со следующего после нее поколения с теми же
+    состояниями генераторов случайных чисел и дает тот же результат, что и запуск без остановки.
+    Если контрольная точка записана с другими настройками ГА или датасетом, поднимается ValueError.
+
+    """
+    with make_evaluator() as evaluator:
+        return _genetic_search(evaluator, make_cache(), make_halving(), resume)
+
+
+
+def _genetic_search(evaluator, cache, halving, resume=False):
+    checkpoint = None
+    if resume and ga.CHECKPOINT_PATH is not None:
+        checkpoint = load_checkpoint(ga.CHECKPOINT_PATH)
+    if checkpoint is None:
+        start = time.perf_counter()
+        # Формируем первое поколение
+        cur_population = init_population(evaluator, cache, halving)
+        evaluations = len(cur_population) - _cache_hits(cache)
+        first_gen = 1
+        _save_checkpoint(first_gen, cur_population, evaluations, start)
+    else:
+        cur_population = checkpoint["population"]
+        evaluations = checkpoint["evaluations"]
+        first_gen = checkpoint["generation"]
+        start = time.perf_counter() - checkpoint["seconds"]
+        print(f"### Продолжение с контрольной точки {ga.CHECKPOINT_PATH}: поколение {first_gen+1} ###")
     # Следующие частично получаем путем изменения параметров первого
-    for gen in range(1, ga.GENERATIONS + 1):
+    for gen in range(first_gen, ga.GENERATIONS + 1):
         print(f"### Поколение {gen+1}/{ga.GENERATIONS} ###")
         next_population = []
         # Несколько лучших особей переходят в следующее поколение без изменений
+        # (особи, отсеянные последовательным отсевом, сюда не попадают: их оценки
+        # всегда хуже оценок на всем датасете, см. genetic.successive_halving)
         next_population.extend(cur_population[:ga.NUM_BEST_INDIV])
         # Создаем остальных потомков
+        children = []
+        while len(next_population) + len(children) < ga.POP_SIZE:
+            children.append(_make_child(cur_population))
+
+        # Обучаем скрытый слой на каждом наборе и оцениваем качество
+        hits = _cache_hits(cache)
+        results = evaluate_population(children, evaluator, cache, halving)
+        evaluations += len(children) - (_cache_hits(cache) - hits)
         num_child = ga.NUM_BEST_INDIV
-        while len(next_population) < ga.POP_SIZE:
+        for child, (anti_selectivity_score, spike_matrix, abort_reason) in zip(children, results):
             num_child += 1
-            p1 = candidate_selection(
-                candidates=cur_population,
-                group_size=3
-            )
-            p2 = candidate_selection(
-                candidates=cur_population,
-                group_size=3
-            )
-            child = mix_params(p1, p2)
-            child = mutate_params(
-                parent=child,
-                mutation_prob=ga.MUTATION_PROB,
-                sigma=0.1
-            )
-            # Обучаем скрытый слой на этом наборе и оцениваем качество
-            anti_selectivity_score, spike_matrix = evaluate_selectivity(
-                params=child,
-                distr_penalty=0.3,
-                dataset=ga.DATASET
+            print(
+                f"\tИндивид {num_child}/{ga.POP_SIZE}: anti_selectivity_score = {anti_selectivity_score}"
+                f"{_abort_note(abort_reason)}"
             )
-            print(f"\tИндивид {num_child}/{ga.POP_SIZE}: anti_selectivity_score = {anti_selectivity_score}")
             next_population.append((anti_selectivity_score , child))
 
             ##### Визуализация и запись нужны только для отладки #####
@@ -85,12 +212,10 @@ def genetic_search():
             for dir_idx, direction in enumerate(ga.DIR2IDX.keys()):
                 spikes_count_by_dir[direction] = spike_matrix[:, dir_idx]
             #plot_direction_heatmap(spikes_count_by_dir, list(ga.DIR2IDX.keys()), COUNT_NEURONS)
-            with open("output.txt", "a") as f:
-                f.write(f"[GEN {gen:02}] individual {len(next_population)}:\n")
-                f.write(f"anti_selectivity_score = {anti_selectivity_score:.4f}\n")
-                for key, val in child.items():
-                    f.write(f" {key}: {val:.5f}\n")
-                f.write("\n")
+            _write_individual(
+                f"[GEN {gen:02}] individual {len(next_population)}",
+                anti_selectivity_score, abort_reason, child
+            )
             #####
 
         # Сортируем от лучшего к худшему
@@ -100,10 +225,180 @@ def genetic_search():
         # Запоминаем лучший результат в текущем поколении
         best_score, best_params = cur_population[0]
         print(f"[GEN {gen:02}]  best score = {best_score:.4f}")
+        if gen % ga.CHECKPOINT_EVERY == 0 or gen == ga.GENERATIONS:
+            _save_checkpoint(gen + 1, cur_population, evaluations, start)
 
     # Финальный результат
     best_score, best_params = cur_population[0]
     print(f"best score={best_score}\n{best_params}")
+    stats = _search_stats("generational", evaluations, time.perf_counter() - start)
+    if cache is not None:
+        print(f"fitness cache: {cache.hits} hits, {cache.misses} misses")
+    if halving is not None:
+        print(
+            f"successive halving: {halving.samples_processed} samples processed "
+            f"instead of {halving.samples_full} "
+            f"({halving.samples_full / max(halving.samples_processed, 1):.1f}x fewer)"
+        )
+    return best_score, best_params, stats
+
+
+
+# Асинхронный ГА без поколений (steady-state)
+def steady_state_search(
+        num_evaluations=None    # сколько потомков оценить (по умолчанию - столько же, сколько в genetic_search)
+):
+    """
+
+    После первого поколения все процессы оценщика (ga.NUM_WORKERS) постоянно заняты:
+    как только оценка одного потомка завершается, он сразу вставляется в популяцию
+    (популяция отсортирована, худшая особь сверх ga.POP_SIZE удаляется),
+    а из текущей популяции выводится и отправляется на оценку новый потомок.
+    Барьера в конце поколения нет, поэтому процессы не простаивают в ожидании
+    самой долгой оценки. Порядок завершения оценок зависит от времени их работы,
+    поэтому при нескольких процессах ход поиска не воспроизводится точно.
+    Последовательный отсев (ga.SUCCESSIVE_HALVING) не используется: он работает с поколением целиком.
+    Возвращает лучшую оценку, лучшие параметры и статистику запуска.
+
+    """
+    with make_evaluator() as evaluator:
+        return _steady_state_search(evaluator, make_cache(), num_evaluations)
+
+
+
+def _steady_state_search(evaluator, cache, num_evaluations=None):
+    if num_evaluations is None:
+        num_evaluations = ga.GENERATIONS * (ga.POP_SIZE - ga.NUM_BEST_INDIV)
+    start = time.perf_counter()
+    population = init_population(evaluator, cache)
+    # Номер вставленной особи (для вывода) и количество оценок, выполненных оценщиком
+    inserted = len(population)
+    evaluations = len(population) - _cache_hits(cache)
+    print(f"### Асинхронный поиск: {num_evaluations} потомков ###")
+
+    submitted = 0
+    # Оценки в работе: Future -> параметры потомка
+    running = {}
+    while submitted < num_evaluations or running:
+        # Загружаем все процессы оценщика
+        while submitted < num_evaluations and len(running) < evaluator.workers:
+            child = _make_child(population)
+            submitted += 1
+            result = cache.get(child) if cache is not None else None
+            if result is not None:
+                inserted += 1
+                _insert(population, child, result, inserted)
+                continue
+            running[evaluator.submit(child)] = child
+        if not running:
+            continue
+
+        # Вставляем в популяцию потомков, оценка которых завершилась
+        done, _ = wait(running, return_when=FIRST_COMPLETED)
+        for future in done:
+            child = running.pop(future)
+            result = future.result()
+            if cache is not None:
+                cache.put(child, result)
+            evaluations += 1
+            inserted += 1
+            _insert(population, child, result, inserted)
+
+    best_score, best_params = population[0]
+    print(f"best score={best_score}\n{best_params}")
+    stats = _search_stats("steady-state", evaluations, time.perf_counter() - start)
+    if cache is not None:
+        print(f"fitness cache: {cache.hits} hits, {cache.misses} misses")
+    return best_score, best_params, stats
+
+
+
+# Сравнение пропускной способности (оценок в час) поколенного и асинхронного ГА
+# с одинаковым количеством потомков; кэш оценок не используется, чтобы второй запуск
+# не получал готовые оценки первого, а последовательный отсев (ga.SUCCESSIVE_HALVING) -
+# чтобы оба запуска оценивали особей на всем датасете
+def compare_schedulers():
+    with make_evaluator() as evaluator:
+        gen_score, _, gen_stats = _genetic_search(evaluator, None, None)
+    with make_evaluator() as evaluator:
+        ss_score, _, ss_stats = _steady_state_search(evaluator, None)
+    print(
+        f"evaluations/hour: generational {gen_stats['evals_per_hour']:.0f}, "
+        f"steady-state {ss_stats['evals_per_hour']:.0f} "
+        f"({ss_stats['evals_per_hour'] / gen_stats['evals_per_hour']:.2f}x); "
+        f"best score: generational {gen_score:.4f}, steady-state {ss_score:.4f}"
+    )
+    return gen_stats, ss_stats
+
+
+
+# Контрольная точка перед поколением generation (если ga.CHECKPOINT_PATH задан)
+def _save_checkpoint(generation, population, evaluations, start):
+    if ga.CHECKPOINT_PATH is None:
+        return
+    save_checkpoint(
+        ga.CHECKPOINT_PATH,
+        generation,
+        population,
+        evaluations=evaluations,
+        seconds=time.perf_counter() - start
+    )
+
+
+
+# Потомок двух родителей, выбранных турниром из population
+def _make_child(population):
+    p1 = candidate_selection(
+        candidates=population,
+        group_size=3
+    )
+    p2 = candidate_selection(
+        candidates=population,
+        group_size=3
+    )
+    child = mix_params(p1, p2)
+    return mutate_params(
+        parent=child,
+        mutation_prob=ga.MUTATION_PROB,
+        sigma=0.1
+    )
+
+
+
+# Вставка оцененного потомка в отсортированную популяцию (худшая особь сверх ga.POP_SIZE удаляется)
+def _insert(population, child, result, num_eval):
+    anti_selectivity_score, spike_matrix, abort_reason = result
+    print(f"\tОценка {num_eval}: anti_selectivity_score = {anti_selectivity_score}{_abort_note(abort_reason)}")
+    population.append((anti_selectivity_score, child))
+    population.sort(key=lambda x: x[0])
+    del population[ga.POP_SIZE:]
+    _write_individual(f"[EVAL {num_eval:04}]", anti_selectivity_score, abort_reason, child)
+
+
+
+# Запись особи в output.txt (для отладки)
+def _write_individual(header, anti_selectivity_score, abort_reason, params):
+    with open("output.txt", "a") as f:
+        f.write(f"{header}:\n")
+        f.write(f"anti_selectivity_score = {anti_selectivity_score:.4f}{_abort_note(abort_reason)}\n")
+        for key, val in params.items():
+            f.write(f" {key}: {val:.5f}\n")
+        f.write("\n")
+
+
+
+# Сколько раз оценка взята из кэша (0 без кэша)
+def _cache_hits(cache):
+    return 0 if cache is None else cache.hits
 
 
 
+# Статистика запуска ГА: количество оценок оценщиком (без попаданий в кэш), время и оценок в час
+def _search_stats(mode, evaluations, seconds):
+    stats = {
+        "evaluations": evaluations,
+        "seconds": seconds,
+        "evals_per_hour": evaluations / seconds * 3600
+    }
+    print(f"[{mode}] {evaluations} evaluations in {seconds:.1f} s: {stats['evals_per_hour']:.0f} evaluations/hour")
+    return stats
@@ -1,4 +1,6 @@
+import json
 import random
+import hashlib
 from core.global_config import FRAME_DT_MS
 
 
@@ -128,3 +130,19 @@ def candidate_selection(
     # Возвращаем лучшего кандидата
     return group[0][1]
 
+
+
+# Канонический вид словаря параметров: строка, одинаковая для равных словарей
+# (ключи по алфавиту, значения как float)
+def canonical_params(params):
+    return json.dumps({key: float(val) for key, val in params.items()}, sort_keys=True)
+
+
+
+# Зерно генератора случайных чисел для набора параметров
+# (в отличие от hash(), не зависит от процесса и запуска)
+def params_seed(*params_list):
+    digest = hashlib.sha256()
+    for params in params_list:
+        digest.update(canonical_params(params).encode())
+    return int.from_bytes(digest.digest()[:4], "little")
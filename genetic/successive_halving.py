@@ -0,0 +1,110 @@
+import math
+import numpy as np
+
+import genetic.ga_config as ga
+from .train_snn import worst_score
+
+
+"""
+
+Оценка поколения последовательным отсевом (successive halving).
+Сначала все особи обучаются на небольшой стратифицированной выборке примеров
+(поровну из каждой группы направление + стиль траектории), затем лучшая
+1/eta часть особей получает выборку больше и т. д.; оставшиеся особи
+оцениваются на всем датасете с ga.EPOCHS эпохами.
+Выборки вложены друг в друга и одинаковы для всех особей и поколений.
+
+Оценки на разных выборках не сравнимы с оценками на всем датасете, поэтому отсеянная
+особь получает оценку train_snn.worst_score + 1 + ее оценка на последней пройденной
+выборке (меньше - лучше). Она строго больше любой оценки на всем датасете, поэтому
+отсеянные особи при сортировке всегда ниже прошедших отбор и элиты прошлых поколений
+и никогда не попадают в элиту (ga.NUM_BEST_INDIV); между собой они упорядочены
+по частичной оценке.
+
+"""
+
+
+
+
+# Стратифицированные вложенные выборки: для каждой доли - номера примеров датасета
+def stratified_subsets(
+        dataset,            # датасет (список словарей с "direction" и "style")
+        fractions,          # доли примеров каждой группы (по возрастанию)
+        seed=0
+):
+    groups = {}
+    for n, sample in enumerate(dataset):
+        groups.setdefault((tuple(sample["direction"]), sample.get("style")), []).append(n)
+    rng = np.random.RandomState(seed)
+    # Один порядок внутри группы для всех долей, чтобы выборки были вложены
+    shuffled = [rng.permutation(indices) for _, indices in sorted(groups.items())]
+    return [
+        np.sort(np.concatenate([
+            indices[:max(1, math.ceil(fraction * len(indices)))] for indices in shuffled
+        ]))
+        for fraction in fractions
+    ]
+
+
+
+
+class SuccessiveHalving:
+    def __init__(
+        self,
+        dataset,                        # датасет, на котором оцениваются особи
+        rungs=((0.125, 1), (0.25, 1)),  # ступени отбора: (доля примеров каждой группы, эпох)
+        eta=3,                          # на следующую ступень проходит 1/eta особей
+        seed=0,                         # зерно выбора примеров
+        distr_penalty=0.3               # вес штрафа (evaluate_selectivity), задает худшую оценку
+    ):
+        self.dataset = dataset
+        self.eta = eta
+        # Сдвиг оценок отсеянных особей: больше любой оценки на всем датасете
+        self.eliminated_offset = worst_score(distr_penalty) + 1.0
+        self.epochs = [epochs for _, epochs in rungs]
+        self.subsets = stratified_subsets(dataset, [fraction for fraction, _ in rungs], seed)
+        # Статистика: обработано примеров с учетом эпох (попадания в кэш не учитываются)
+        # и сколько было бы обработано без отсева
+        self.samples_processed = 0
+        self.samples_full = 0
+
+
+    # Оценка списка особей; возвращает (anti_selectivity_score, spike_matrix, abort_reason) в порядке params_list
+    def evaluate(
+            self,
+            params_list,
+            evaluator,          # SerialEvaluator / ProcessPoolEvaluator (оценка на ступенях)
+            final=None          # оценка на всем датасете, например, с кэшем (по умолчанию evaluator.evaluate)
+    ):
+        if final is None:
+            final = evaluator.evaluate
+        full_cost = len(self.dataset) * ga.EPOCHS
+        results = [None] * len(params_list)
+        candidates = list(range(len(params_list)))
+
+        for sample_indices, epochs in zip(self.subsets, self.epochs):
+            keep = math.ceil(len(candidates) / self.eta)
+            if keep == len(candidates):
+                break
+            rung_results = evaluator.evaluate(
+                [params_list[i] for i in candidates],
+                sample_indices=sample_indices,
+                epochs=epochs
+            )
+            self.samples_processed += len(candidates) * len(sample_indices) * epochs
+            for i, result in zip(candidates, rung_results):
+                results[i] = result
+            # Стабильная сортировка: при равных оценках порядок особей сохраняется
+            candidates = sorted(candidates, key=lambda i: results[i][0])[:keep]
+
+        promoted = set(candidates)
+        final_results = final([params_list[i] for i in candidates])
+        self.samples_processed += len(candidates) * full_cost
+        self.samples_full += len(params_list) * full_cost
+        for i, result in zip(candidates, final_results):
+            results[i] = result
+
+        for i, (score, spike_matrix, abort_reason) in enumerate(results):
+            if i not in promoted:
+                results[i] = (self.eliminated_offset + score, spike_matrix, abort_reason)
+        return results
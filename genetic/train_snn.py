@@ -1,38 +1,31 @@
 import numpy as np
 import genetic.ga_config as ga
 from core import global_config as cfg
-from core.input_layer import (
-    init_event_generator, 
-    generate_events
-)
+from core.params import NetworkParams
+from core.input_layer import generate_events_batch
 from core.hidden_layer import (
     init_hidden_layer,
     reset_hidden_layer,
-    hidden_layer_step
+    hidden_layer_step,
+    hidden_layer_run
+)
+from core.hidden_population import (
+    init_hidden_population,
+    reset_hidden_population,
+    hidden_population_run
 )
+from utils.data_converter import stack_frames, event_store_from_arrays, store_sample_events
+from .operators import params_seed
 
 
 # Константа для вычислений
 LOG8 = np.log(8)
-
-
-
-# Обновление значений гиперпараметров сети
-def _set_params(params):
-    cfg.TAU_LEAK = params["TAU_LEAK"]
-    cfg.I_THRES = params["I_THRES"]
-    cfg.T_REF = params["T_REF"]
-    cfg.T_INHIBIT = params["T_INHIBIT"]
-    cfg.ALPHA_PLUS = params["ALPHA_PLUS"]
-    cfg.ALPHA_MINUS = params["ALPHA_MINUS"]
-    cfg.BETA_PLUS = params["BETA_PLUS"]
-    cfg.BETA_MINUS = params["BETA_MINUS"]
-    cfg.T_LTP = params["T_LTP"]
-    cfg.W_INIT_MEAN = params["W_INIT_MEAN"]
-    cfg.W_INIT_STD = params["W_INIT_STD"]
-    cfg.W_MIN = params["W_MIN"]
-    cfg.W_MAX = params["W_MAX"]
-    cfg.W_RANGE = cfg.W_MAX - cfg.W_MIN
+# Причины ранней остановки оценки (AbortMonitor)
+ABORT_REASONS = (
+    "silent",       # сеть не дает спайков
+    "runaway",      # спайков на событие больше ga.ABORT_SPIKES_PER_EVENT
+    "pinned"        # пороги всех нейронов на границах допустимого диапазона
+)
 
 
 
@@ -40,91 +33,336 @@ def _set_params(params):
 def evaluate_selectivity(
         params,                 # словарь гиперпараметров сети
         distr_penalty=0.3,      # вес штрафа за неравномерное распределение нейронов по направлениям
-        dataset=None            # датасет (словарь)
+        dataset=None,           # датасет (словарь)
+        weight_dtype=np.float32,# тип весов скрытого слоя (float32 / uint16 / uint8, см. core.quantization)
+        frames=None,            # кадры датасета (N, T, H, W), если уже собраны (например, в общей памяти)
+        event_store=None,       # события датасета (dataset_events или utils.data_converter.load_event_store)
+        sample_indices=None,    # номера примеров датасета для обучения (None - все)
+        epochs=None             # количество эпох (None - ga.EPOCHS)
 ):
-    np.random.seed(hash(frozenset(params.items())) & 0xFFFFFFFF)
+    """
+
+    sample_indices и epochs задают оценку на части датасета (genetic.successive_halving);
+    порог активности нейрона ga.MIN_SPIKES_FOR_ACTIVE уменьшается пропорционально доле примеров.
+    Возвращает (anti_selectivity_score, spike_matrix, abort_reason): если сеть безнадежна
+    (см. AbortMonitor), обучение останавливается, оценка - как у сети без единого спайка,
+    abort_reason - причина из ABORT_REASONS (иначе None).
+
+    """
+    np.random.seed(params_seed(params))
+    sample_indices, epochs = _fidelity(dataset, sample_indices, epochs)
 
+    # События всех примеров (одни и те же для всех эпох)
+    if event_store is None:
+        event_store = dataset_events(dataset, frames)
     # Запоминаем количество кадров в одном примере датасета
-    num_frames = len(dataset[0]["frames"])
+    num_frames = event_store["offsets"].shape[1]
 
-    # Обновляем глобальные константы
-    _set_params(params)
+    # Гиперпараметры сети (глобальные константы не меняются)
+    net_params = NetworkParams.from_dict(params)
 
     # Инициализируем скрытый слой
-    hidden = init_hidden_layer()
+    hidden = init_hidden_layer(net_params, weight_dtype=weight_dtype)
 
     # Заводим статистику спайков по направлениям 
     # (строки - нейроны, столбцы - направления; ячейка - количество спайков)
     spike_matrix = np.zeros((cfg.COUNT_NEURONS, 8), dtype=np.int32)
+    monitor = AbortMonitor()
 
-    for _ in range(ga.EPOCHS):
-        dataset_local = np.random.permutation(dataset)
+    for _ in range(epochs):
+        order = np.random.permutation(sample_indices)
         spike_matrix[:, :] = 0
         # Прогоняем алгоритм на каждом примере (последовательность кадров) из датасета
-        for sample in dataset_local:
-            # Инициализируем генератор событий
-            ev_gen = init_event_generator()
-            # Запоминаем первый кадр
-            prev_frame = sample["frames"][0]
-            # Устанавливаем начальное время симуляции
-            prev_t = 0.0
-            # Обрабатываем кадры, начиная со второго
+        for sample_idx in order:
+            sample = dataset[sample_idx]
+            # События примера и границы интервалов между кадрами внутри него
+            sample_events, offsets = _sample_events(event_store, sample_idx)
+            # Обрабатываем интервалы между соседними кадрами
             for frame_i in range(1, num_frames):
-                # Берем следующий кадр
-                new_frame = sample["frames"][frame_i]
-                # Фиксируем время поступления нового кадра
-                new_t = frame_i * cfg.FRAME_DT_MS
-
-                # Генерируем события между двумя соседними кадрами
-                events = generate_events(
-                    state=ev_gen,
-                    old_frame=prev_frame,
-                    new_frame=new_frame,
-                    prev_t=prev_t,
-                    new_t=new_t
-                )
+                # События между двумя соседними кадрами
+                events = sample_events[offsets[frame_i - 1]:offsets[frame_i]]
 
                 # Для адаптации величины сигнала по количеству событий
                 norm_factor = min(1.0, ga.AVERAGE_EV_PER_FRAME/(len(events) + 1e-12))
 
                 # Передаем события в скрытый слой
-                for ev in events:
-                    hidden_layer_step(
+                if ga.CHUNKED_RUN:
+                    hidden_layer_run(
                         state=hidden,
-                        event=ev,
+                        events=events,
                         train=True, # обучение
-                        norm_factor=norm_factor          
+                        norm_factor=norm_factor
                     )
-
-                # Обновляем кадр
-                prev_frame, prev_t = new_frame, new_t
+                else:
+                    for ev in events:
+                        hidden_layer_step(
+                            state=hidden,
+                            event=ev,
+                            train=True, # обучение
+                            norm_factor=norm_factor
+                        )
 
             # Сопоставляем текущее направление движения его номеру
             dir_ = sample["direction"]
             dir_idx = ga.DIR2IDX[tuple(dir_)]
-            spikes_this_sample = np.zeros(cfg.COUNT_NEURONS, dtype=np.bool_)
 
             # Считаем количество спайков за это направление
-            for (_, neuron_idx) in hidden["spikes"]:
-                spike_matrix[neuron_idx, dir_idx] += 1
-                spikes_this_sample[neuron_idx] += 1
+            spikes_this_sample = hidden.spikes.counts(cfg.COUNT_NEURONS)
+            spike_matrix[:, dir_idx] += spikes_this_sample
 
             # Для слишком активных нейронов повышаем порог
             if_overactive = spikes_this_sample >= ga.MAX_SPIKES_PER_SAMPLE
-            hidden["thresh"][if_overactive] *= ga.HOMEO_UP
+            hidden.thresh[if_overactive] *= ga.HOMEO_UP
             # Для неактивных понижаем 
             # (неактивными считаются те, которые молчат не менее NUM_INACTIVE_SAMPLES примеров подряд)
             if_inactivity = spikes_this_sample == 0
-            hidden["inactivity"][if_inactivity] += 1
-            hidden["inactivity"][~if_inactivity] = 0
-            need_down = hidden["inactivity"] >= ga.NUM_INACTIVE_SAMPLES
-            hidden["thresh"][need_down] *= ga.HOMEO_DOWN
+            hidden.inactivity[if_inactivity] += 1
+            hidden.inactivity[~if_inactivity] = 0
+            need_down = hidden.inactivity >= ga.NUM_INACTIVE_SAMPLES
+            hidden.thresh[need_down] *= ga.HOMEO_DOWN
             # Ограничиваем в допустимых диапазонах
-            hidden["thresh"] = np.clip(hidden["thresh"], 0.1 * cfg.I_THRES, 5 * cfg.I_THRES)
+            hidden.thresh = np.clip(hidden.thresh, 0.1 * net_params.I_THRES, 5 * net_params.I_THRES)
 
             # Сбрасываем состояние нейронов скрытого слоя
             reset_hidden_layer(hidden)
 
+            # Останавливаем обучение безнадежной сети
+            if monitor.update(
+                spikes_this_sample.sum(keepdims=True), len(sample_events), hidden.thresh[None],
+                0.1 * net_params.I_THRES, 5 * net_params.I_THRES
+            ):
+                break
+        if monitor.done():
+            break
+
+    if monitor.reasons[0] is not None:
+        return worst_score(distr_penalty), spike_matrix, monitor.reasons[0]
+    min_active = ga.MIN_SPIKES_FOR_ACTIVE * len(sample_indices) / len(dataset)
+    anti_selectivity_score = _selectivity_score(spike_matrix, distr_penalty, min_active)
+    return anti_selectivity_score, spike_matrix, None
+
+
+
+# Прогон популяции сетей (разные наборы гиперпараметров) на общем потоке событий
+def evaluate_selectivity_population(
+        params_list,            # список словарей гиперпараметров сетей
+        distr_penalty=0.3,      # вес штрафа за неравномерное распределение нейронов по направлениям
+        dataset=None,           # датасет (словарь)
+        event_store=None,       # события датасета (см. evaluate_selectivity)
+        sample_indices=None,    # номера примеров для обучения (см. evaluate_selectivity)
+        epochs=None             # количество эпох (None - ga.EPOCHS)
+):
+    """
+
+    То же, что evaluate_selectivity для каждого набора params_list, но все сети
+    обучаются одновременно (core.hidden_population): события перебираются
+    один раз на все сети.
+    Возвращает список (anti_selectivity_score, spike_matrix, abort_reason) в порядке params_list;
+    обучение останавливается, когда безнадежны все сети.
+
+    """
+    np.random.seed(params_seed(*params_list))
+    sample_indices, epochs = _fidelity(dataset, sample_indices, epochs)
+
+    if event_store is None:
+        event_store = dataset_events(dataset)
+    num_frames = event_store["offsets"].shape[1]
+    num_nets = len(params_list)
+
+    population = init_hidden_population(params_list)
+    i_thres = population.consts["I_THRES"]
+
+    # Статистика спайков по направлениям для каждой сети
+    spike_matrix = np.zeros((num_nets, cfg.COUNT_NEURONS, 8), dtype=np.int32)
+    monitor = AbortMonitor(num_nets)
+
+    for _ in range(epochs):
+        order = np.random.permutation(sample_indices)
+        spike_matrix[:, :, :] = 0
+        for sample_idx in order:
+            sample = dataset[sample_idx]
+            sample_events, offsets = _sample_events(event_store, sample_idx)
+            for frame_i in range(1, num_frames):
+                events = sample_events[offsets[frame_i - 1]:offsets[frame_i]]
+                norm_factor = min(1.0, ga.AVERAGE_EV_PER_FRAME/(len(events) + 1e-12))
+                hidden_population_run(
+                    state=population,
+                    events=events,
+                    train=True,
+                    norm_factor=norm_factor
+                )
+
+            dir_idx = ga.DIR2IDX[tuple(sample["direction"])]
+            spikes_this_sample = np.stack([
+                spikes.counts(cfg.COUNT_NEURONS) for spikes in population.spikes
+            ])
+            spike_matrix[:, :, dir_idx] += spikes_this_sample
+
+            # Гомеостаз порогов (как в evaluate_selectivity, для всех сетей сразу)
+            if_overactive = spikes_this_sample >= ga.MAX_SPIKES_PER_SAMPLE
+            population.thresh[if_overactive] *= ga.HOMEO_UP
+            if_inactivity = spikes_this_sample == 0
+            population.inactivity[if_inactivity] += 1
+            population.inactivity[~if_inactivity] = 0
+            need_down = population.inactivity >= ga.NUM_INACTIVE_SAMPLES
+            population.thresh[need_down] *= ga.HOMEO_DOWN
+            population.thresh = np.clip(
+                population.thresh, 0.1 * i_thres, 5 * i_thres
+            ).astype(np.float32)
+
+            reset_hidden_population(population)
+
+            if monitor.update(
+                spikes_this_sample.sum(axis=1), len(sample_events), population.thresh,
+                0.1 * i_thres, 5 * i_thres
+            ):
+                break
+        if monitor.done():
+            break
+
+    min_active = ga.MIN_SPIKES_FOR_ACTIVE * len(sample_indices) / len(dataset)
+    return [
+        (_selectivity_score(spike_matrix[k], distr_penalty, min_active), spike_matrix[k], None)
+        if reason is None else
+        (worst_score(distr_penalty), spike_matrix[k], reason)
+        for k, reason in enumerate(monitor.reasons)
+    ]
+
+
+
+# Сравнение квантованных весов с float32: память и селективность
+def compare_weight_dtypes(
+        params,                 # словарь гиперпараметров сети
+        dtypes=(np.float32, np.uint16, np.uint8),
+        distr_penalty=0.3,
+        dataset=None,
+        verbose=True
+):
+    """
+
+    Для каждого типа весов обучает скрытый слой как evaluate_selectivity
+    и возвращает словарь: тип -> (байт на матрицу весов, оценка, количество активных нейронов).
+
+    """
+    report = {}
+    for dtype in dtypes:
+        nbytes = cfg.COUNT_NEURONS * cfg.IMAGE_HEIGHT * cfg.IMAGE_WIDTH * 2 * np.dtype(dtype).itemsize
+        score, spike_matrix, _ = evaluate_selectivity(params, distr_penalty, dataset, weight_dtype=dtype)
+        active = int((spike_matrix.sum(axis=1) >= ga.MIN_SPIKES_FOR_ACTIVE).sum())
+        report[np.dtype(dtype).name] = (nbytes, score, active)
+
+    if verbose:
+        for name, (nbytes, score, active) in report.items():
+            print(f"{name:8s} weights {nbytes / 1024:8.1f} KiB  score {score:.4f}  active {active}")
+    return report
+
+
+
+# События всех примеров датасета с фиксированным зерном ga.EVENT_SEED (хранилище в памяти)
+def dataset_events(
+        dataset,                # датасет (словарь)
+        frames=None             # кадры датасета (N, T, H, W), если уже собраны
+):
+    """
+
+    События зависят только от кадров и случайных смещений времени, но не от гиперпараметров сети,
+    поэтому их достаточно сгенерировать один раз для всех особей и эпох.
+    Формат - как у utils.data_converter.load_event_store (offsets[n, k] - начало событий
+    между кадрами k и k+1 примера n).
+
+    """
+    return event_store_from_arrays(*dataset_event_buffer(dataset, frames))
+
+
+
+# События датасета одним буфером core.events и границы интервалов (N, T)
+def dataset_event_buffer(
+        dataset,                # датасет (словарь)
+        frames=None             # кадры датасета (N, T, H, W), если уже собраны
+):
+    if frames is None:
+        frames = stack_frames(dataset)
+    return generate_events_batch(
+        frames=frames,
+        dt=cfg.FRAME_DT_MS,
+        rng=np.random.RandomState(ga.EVENT_SEED)
+    )
+
+
+
+# Отслеживание безнадежных сетей во время обучения (по статистике спайков после каждого примера)
+class AbortMonitor:
+    """
+
+    Сеть считается безнадежной, если ga.ABORT_SAMPLES примеров подряд:
+        silent  - в ней нет ни одного спайка
+        runaway - спайков на событие больше ga.ABORT_SPIKES_PER_EVENT
+        pinned  - пороги всех нейронов на границах диапазона (гомеостаз ничего не может исправить)
+    Выключается ga.EARLY_ABORT = False.
+
+    """
+    __slots__ = ("counters", "reasons")
+
+    def __init__(self, num_nets=1):
+        # Сколько примеров подряд выполняется каждое условие (строки - ABORT_REASONS)
+        self.counters = np.zeros((len(ABORT_REASONS), num_nets), dtype=np.int64)
+        self.reasons = [None] * num_nets
+
+
+    # Учет очередного примера; True, если безнадежны все сети
+    def update(
+            self,
+            spikes,         # количество спайков каждой сети за пример (K,)
+            num_events,     # количество событий в примере
+            thresh,         # пороги нейронов (K, N)
+            thresh_min,     # границы диапазона порогов (число или (K, 1))
+            thresh_max
+    ):
+        if not ga.EARLY_ABORT:
+            return False
+        conditions = (
+            spikes == 0,
+            spikes > ga.ABORT_SPIKES_PER_EVENT * num_events,
+            (np.isclose(thresh, thresh_min) | np.isclose(thresh, thresh_max)).all(axis=1)
+        )
+        for counter, condition in zip(self.counters, conditions):
+            counter[:] = np.where(condition, counter + 1, 0)
+        for k in np.nonzero((self.counters >= ga.ABORT_SAMPLES).any(axis=0))[0]:
+            if self.reasons[k] is None:
+                self.reasons[k] = ABORT_REASONS[int(np.argmax(self.counters[:, k] >= ga.ABORT_SAMPLES))]
+        return self.done()
+
+
+    def done(self):
+        return all(reason is not None for reason in self.reasons)
+
+
+
+# Худшая возможная оценка (сеть без единого спайка); ее получают остановленные сети
+def worst_score(distr_penalty):
+    return _selectivity_score(np.zeros((cfg.COUNT_NEURONS, 8), dtype=np.int32), distr_penalty)
+
+
+
+# Номера примеров и количество эпох оценки (по умолчанию - весь датасет и ga.EPOCHS)
+def _fidelity(dataset, sample_indices, epochs):
+    if sample_indices is None:
+        sample_indices = np.arange(len(dataset))
+    if epochs is None:
+        epochs = ga.EPOCHS
+    return np.asarray(sample_indices), epochs
+
+
+
+# События примера n и границы его интервалов (относительно начала примера)
+def _sample_events(event_store, n):
+    offsets = event_store["offsets"][n]
+    return store_sample_events(event_store, n), offsets - offsets[0]
+
+
+
+# Оценка селективности по матрице спайков (чем больше значение, тем хуже)
+def _selectivity_score(spike_matrix, distr_penalty, min_active=None):
     # Считаем общее количество спайков для каждого нейрона за весь датасет
     spikes_per_neuron = spike_matrix.sum(axis=1, dtype=np.float32)
     # Защита от деления на ноль
@@ -137,7 +375,9 @@ def evaluate_selectivity(
     # Энтропия Шеннона для оценки селективности нейронов
     H = -(p * log_p).sum(axis=1)
     # Для неактивных нейронов ставим высокую энтропию
-    H[spikes_per_neuron < ga.MIN_SPIKES_FOR_ACTIVE] = 1.0 
+    if min_active is None:
+        min_active = ga.MIN_SPIKES_FOR_ACTIVE
+    H[spikes_per_neuron < min_active] = 1.0 
     # Среднее значение энтропии         
     H_mean = H.mean()
 
@@ -159,6 +399,4 @@ def evaluate_selectivity(
 
     # Оцениваем качество гиперпараметров
     # Чем больше значение, тем хуже селективность
-    anti_selectivity_score = H_mean + distr_penalty * average_dev 
-
-    return anti_selectivity_score, spike_matrix
+    return H_mean + distr_penalty * average_dev
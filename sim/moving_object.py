@@ -51,14 +51,22 @@ class Moving_Object:
 
 
 
-    # "Рисует" белый квадрат на кадре frame 
-    # (frame - numpy матрица с нормированными значениями яркости)
-    def fix_obj(self, frame):
+    # Прямоугольник, который занимает объект на сцене: (y_min, y_max, x_min, x_max),
+    # правые границы не включаются
+    def footprint(self):
         x_min = int(self.center_x - self.obj_radius)
         x_max = int(self.center_x + self.obj_radius)
         y_min = int(self.center_y - self.obj_radius)
         y_max = int(self.center_y + self.obj_radius)
-        frame[y_min:y_max+1, x_min:x_max+1] = 1.0
+        return (y_min, y_max + 1, x_min, x_max + 1)
+
+
+
+    # "Рисует" белый квадрат на кадре frame 
+    # (frame - numpy матрица с нормированными значениями яркости)
+    def fix_obj(self, frame):
+        y_min, y_max, x_min, x_max = self.footprint()
+        frame[y_min:y_max, x_min:x_max] = 1.0
 
 
     
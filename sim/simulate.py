@@ -3,7 +3,10 @@ from matplotlib.patches import Rectangle
 import matplotlib.animation as animation
 
 from .tracking_object import Tracking_Object
-from core.input_layer import init_event_generator, generate_events
+from .snn_controller import SNN_Controller
+from core.events import concat_events
+from core.input_layer import init_event_generator
+from .stream import camera_frames, frame_events
 import utils.visualization as v
 
 
@@ -18,28 +21,44 @@ def simulate(
         obj_radius=2,               # половина стороны квадрата (объект)
         obj_direction=(1, 0),       # направление движения объекта (x, y)
         noise=0,                    # максимальное отклонение от основной траектории
-        show_hist=True              # строить ли гистограмму после периода наблюдения
+        show_hist=True,             # строить ли гистограмму после периода наблюдения
+        snn_control=False,          # если True, камерой управляет спайковая сеть (SNN_Controller)
+        deadline_ms=None,           # дедлайн обработки кадра сетью (мс); по умолчанию dt
+        deadline_policy="skip"      # политика при пропуске дедлайна (см. SNN_Controller)
 ):
+    # Контроллер камеры на спайковой сети
+    controller = None
+    if snn_control:
+        controller = SNN_Controller(
+            window_size=window_size,
+            dt=dt,
+            deadline_ms=deadline_ms,
+            policy=deadline_policy
+        )
+
     # Настриваем симуляцию (камера и объект)
     simulator = Tracking_Object(
         field_size=field_size,
         window_size=window_size,
         obj_radius=obj_radius,
         obj_direction=obj_direction,
-        noise=noise
+        noise=noise,
+        controller=controller
     )
     # Сбрасываем в начальное состояние (объект и камера в центре)
     simulator.reset()
 
     # Инициализируем генератор событий (генерируем словарь состояния генератора)
     state = init_event_generator(frame_shape=window_size)
-    # Список событий
-    all_events = []     
-    # Текущее время в симуляции
-    cur_time = 0.0      
-
-    # Берем первый кадр из камеры
-    prev_view = simulator.get_camera_view()
+    # Поток событий: каждый запрос двигает симуляцию на шаг
+    # и возвращает события между предыдущим и новым кадрами камеры
+    event_batches = frame_events(
+        frames=camera_frames(simulator, observe_steps=observe_steps),
+        dt=dt,
+        state=state
+    )
+    # Буферы событий за период наблюдения (нужны только для гистограммы)
+    observed_events = []
 
     fig, ax = plt.subplots()
 
@@ -64,41 +83,23 @@ def simulate(
 
     # Функция изменения кадра
     def update(frame_index):
-        nonlocal cur_time, prev_view, state, all_events, hist_shown
+        nonlocal hist_shown
 
-        # Если период наблюдения не закончился, то двигаем только объект
-        if frame_index < observe_steps:
-            simulator.object.step()
-            simulator.current_field[:] = 0.0
-            simulator.object.fix_obj(simulator.current_field)
-        # Иначе двигаем и объект, и камеру
-        else:
-            simulator.step()
+        # Шаг симуляции и генерация событий между предыдущим и новым кадром
+        # (в период наблюдения двигается только объект, затем и объект, и камера)
+        events = next(event_batches)
 
         # Обновляем картинку поля
         img.set_array(simulator.current_field)
         rect.set_xy((simulator.camera.top_left_x, simulator.camera.top_left_y))
 
-        # Получаем новый кадр из камеры
-        new_view = simulator.get_camera_view()
-
-        # Генерация событий между предыдущим и новым кадром
-        events = generate_events(
-            state=state,
-            old_frame=prev_view,
-            new_frame=new_view,
-            prev_t=cur_time,
-            new_t=cur_time + dt
-        )
-        all_events.extend(events)
-
-        # Обновляем кадр и время
-        prev_view = new_view.copy()
-        cur_time += dt
-
-        if show_hist and (frame_index == observe_steps) and not hist_shown:
-            v.plot_events(all_events, dt=dt)
-            hist_shown = True
+        # События копим только до построения гистограммы
+        if show_hist and not hist_shown:
+            observed_events.append(events)
+            if frame_index == observe_steps:
+                v.plot_events(concat_events(observed_events))
+                observed_events.clear()
+                hist_shown = True
 
         # Возвращаем объекты, которые нужно перерисовывать анимации
         return [img, rect]
@@ -113,3 +114,7 @@ def simulate(
     )
 
     plt.show()
+
+    # Задержки сети и пропуски дедлайна
+    if controller is not None:
+        print(controller.latency_stats())
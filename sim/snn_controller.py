@@ -0,0 +1,213 @@
+import time
+import numpy as np
+
+import core.global_config as cfg
+from core.input_layer import init_event_generator, generate_events
+from core.hidden_layer import (
+    init_hidden_layer,
+    reset_hidden_layer,
+    hidden_layer_run,
+    hidden_layer_run_binned
+)
+from core.output_layer import init_output_layer, reset_output_layer, output_layer_run
+from .stream import iter_events, hidden_spikes
+
+
+"""
+
+Управление камерой спайковой сетью: кадр -> события -> скрытый слой -> выходной слой ->
+сдвиг камеры на шаг в направлении нейрона выходного слоя с наибольшим числом спайков.
+Для каждого кадра измеряется полная задержка обработки и сравнивается с дедлайном.
+
+"""
+
+
+# Сдвиг камеры для каждого нейрона выходного слоя
+# (порядок направлений как в genetic.ga_config.DIR2IDX)
+OUT_MOVES = [
+    (0, 1),         # вниз
+    (1, 0),         # вправо
+    (1, 1),         # вправо-вниз
+    (0, -1),        # вверх
+    (-1, 0),        # влево
+    (-1, -1),       # влево-вверх
+    (1, -1),        # вправо-вверх
+    (-1, 1)         # влево-вниз
+]
+# Политики при пропуске дедлайна
+DEADLINE_POLICIES = ("none", "skip", "degrade")
+# Желаемое среднее количество событий между кадрами (для norm_factor, как при обучении)
+EV_PER_FRAME = 40
+# Режим degrade: сколько кадров подряд задержка должна быть не больше
+# RECOVER_RATIO * дедлайна, чтобы вернуться к точной обработке
+RECOVER_FRAMES = 10
+RECOVER_RATIO = 0.5
+
+
+
+
+class SNN_Controller:
+    def __init__(
+        self,
+        window_size=(28,28),    # размер окна обзора камеры (высота, ширина)
+        dt=33,                  # время между кадрами (мс)
+        hidden=None,            # состояние скрытого слоя (по умолчанию - новое)
+        output=None,            # состояние выходного слоя (по умолчанию - новое)
+        deadline_ms=None,       # допустимая задержка обработки кадра (мс); по умолчанию dt
+        policy="skip",          # что делать при пропуске дедлайна (DEADLINE_POLICIES)
+        bin_ms=1.0,             # ширина окна hidden_layer_run_binned в режиме degrade
+        chunked=False           # блочная обработка событий (hidden_layer_run) вместо пособытийной
+    ):
+        """
+
+        Политики при пропуске дедлайна:
+            none    - решение применяется, пропуск только учитывается в статистике
+            skip    - запоздавшее решение отбрасывается, камера остается на месте
+            degrade - решение применяется, а следующие кадры обрабатываются приближенно
+                      (hidden_layer_run_binned), пока задержка не станет заметно меньше дедлайна
+
+        """
+        if policy not in DEADLINE_POLICIES:
+            raise ValueError(f"Неизвестная политика {policy}, допустимые: {DEADLINE_POLICIES}")
+        self.window_size = window_size
+        self.dt = dt
+        self.deadline_ms = dt if deadline_ms is None else deadline_ms
+        self.policy = policy
+        self.bin_ms = bin_ms
+        self.chunked = chunked
+
+        # Слои сети
+        self.hidden = init_hidden_layer() if hidden is None else hidden
+        self.output = init_output_layer() if output is None else output
+
+        # Генератор событий, предыдущий кадр и время последнего кадра (мс)
+        self.gen_state = init_event_generator(frame_shape=window_size)
+        self.prev_frame = None
+        self.t = 0.0
+
+        # Последнее решение (сдвиг камеры) и количество событий в последнем кадре
+        self.last_move = (0, 0)
+        self.last_events = 0
+        # Приближенная обработка (режим degrade) и сколько кадров подряд задержка мала
+        self.degraded = False
+        self.fast_frames = 0
+
+        # Статистика
+        self.latencies = []     # задержка каждого кадра (мс)
+        self.misses = 0         # кадры с задержкой больше дедлайна
+        self.skipped = 0        # отброшенные решения (политика skip)
+        self.degraded_frames = 0
+        self.num_events = 0
+
+
+    # Сброс динамики сети и генератора событий (веса и статистика сохраняются)
+    def reset(self):
+        self.gen_state = init_event_generator(frame_shape=self.window_size)
+        self.prev_frame = None
+        self.t = 0.0
+        self.last_move = (0, 0)
+        self.degraded = False
+        self.fast_frames = 0
+        reset_hidden_layer(self.hidden)
+        reset_output_layer(self.output, reset_weights=False)
+
+
+    # Решение по новому кадру камеры: сдвиг (dx, dy)
+    def decide(
+            self,
+            frame,          # кадр камеры
+            roi=None        # область, где кадр мог измениться (Tracking_Object.dirty_rect)
+    ):
+        start = time.perf_counter()
+        # Первый кадр только запоминаем
+        if self.prev_frame is None:
+            self.prev_frame = frame.copy()
+            return (0, 0)
+
+        # События между предыдущим и новым кадром
+        events = generate_events(
+            state=self.gen_state,
+            old_frame=self.prev_frame,
+            new_frame=frame,
+            prev_t=self.t,
+            new_t=self.t + self.dt,
+            roi=roi
+        )
+        self.prev_frame[:] = frame
+        self.t += self.dt
+
+        # Скрытый слой (без обучения) и выходной слой по спайкам за этот кадр
+        norm_factor = min(1.0, EV_PER_FRAME / (len(events) + 1e-12))
+        if self.degraded or self.chunked:
+            if self.degraded:
+                hidden_layer_run_binned(
+                    self.hidden, events, bin_ms=self.bin_ms, train=False, norm_factor=norm_factor
+                )
+                self.degraded_frames += 1
+            else:
+                hidden_layer_run(self.hidden, events, train=False, norm_factor=norm_factor)
+            output_layer_run(self.output, self.hidden.spikes.times, self.hidden.spikes.neurons)
+            self.hidden.spikes.clear()
+        else:
+            # Пособытийно: спайки скрытого слоя забираются из потока по мере появления
+            spikes = list(hidden_spikes(
+                self.hidden, iter_events([events]), train=False, norm_factor=norm_factor
+            ))
+            output_layer_run(
+                self.output, [t for t, _ in spikes], [neuron for _, neuron in spikes]
+            )
+
+        # Направление выходного нейрона с наибольшим числом спайков
+        counts = self.output.spikes.counts(cfg.OUT_NEURONS)
+        self.output.spikes.clear()
+        move = OUT_MOVES[int(np.argmax(counts))] if counts.any() else (0, 0)
+
+        latency = (time.perf_counter() - start) * 1000.0
+        self.last_events = len(events)
+        self.num_events += len(events)
+        return self._apply_deadline(move, latency)
+
+
+    # Учет задержки кадра и политика при пропуске дедлайна
+    def _apply_deadline(self, move, latency):
+        self.latencies.append(latency)
+        missed = latency > self.deadline_ms
+        if missed:
+            self.misses += 1
+
+        if self.policy == "skip" and missed:
+            self.skipped += 1
+            move = (0, 0)
+        elif self.policy == "degrade":
+            if missed:
+                self.degraded = True
+                self.fast_frames = 0
+            elif self.degraded and latency <= RECOVER_RATIO * self.deadline_ms:
+                self.fast_frames += 1
+                if self.fast_frames >= RECOVER_FRAMES:
+                    self.degraded = False
+                    self.fast_frames = 0
+
+        self.last_move = move
+        return move
+
+
+    # Статистика задержек (мс) и пропусков дедлайна
+    def latency_stats(self):
+        latencies = np.asarray(self.latencies)
+        frames = len(latencies)
+        if frames == 0:
+            latencies = np.zeros(1)
+        return {
+            "frames": frames,
+            "deadline_ms": self.deadline_ms,
+            "misses": self.misses,
+            "miss_rate": self.misses / frames if frames else 0.0,
+            "skipped": self.skipped,
+            "degraded_frames": self.degraded_frames,
+            "events": self.num_events,
+            "mean_ms": float(latencies.mean()),
+            "p50_ms": float(np.percentile(latencies, 50)),
+            "p95_ms": float(np.percentile(latencies, 95)),
+            "max_ms": float(latencies.max())
+        }
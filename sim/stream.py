@@ -0,0 +1,94 @@
+from core.input_layer import init_event_generator, generate_events
+from core.hidden_layer import hidden_layer_step
+
+
+"""
+
+Потоковая обработка симуляции:
+кадры камеры -> события между кадрами -> поток событий по времени -> скрытый слой.
+Каждое звено - генератор, который держит в памяти только текущий интервал между кадрами,
+поэтому память не растет с длиной симуляции.
+
+"""
+
+
+
+# Кадры камеры: первый кадр до движения, затем по кадру на каждый шаг симуляции
+def camera_frames(
+        simulator,              # Tracking_Object
+        observe_steps=0,        # первые observe_steps шагов камера не двигается
+        steps=None              # количество шагов (None - бесконечно)
+):
+    """
+
+    Выдает пары (кадр камеры, область изменений roi);
+    для первого кадра roi = None (весь кадр).
+
+    """
+    yield simulator.get_camera_view().copy(), None
+    step_i = 0
+    while steps is None or step_i < steps:
+        simulator.step(follow=step_i >= observe_steps)
+        yield simulator.get_camera_view().copy(), simulator.dirty_rect
+        step_i += 1
+
+
+
+# События между соседними кадрами: по одному отсортированному буферу на интервал
+def frame_events(
+        frames,                 # поток пар (кадр, roi) из camera_frames
+        dt,                     # время между кадрами (мс)
+        state=None,             # состояние генератора событий
+        start_t=0.0             # время первого кадра (мс)
+):
+    frames = iter(frames)
+    prev_frame, _ = next(frames)
+    if state is None:
+        state = init_event_generator(frame_shape=prev_frame.shape)
+    cur_t = start_t
+    for new_frame, roi in frames:
+        yield generate_events(
+            state=state,
+            old_frame=prev_frame,
+            new_frame=new_frame,
+            prev_t=cur_t,
+            new_t=cur_t + dt,
+            roi=roi
+        )
+        prev_frame = new_frame
+        cur_t += dt
+
+
+
+# Поток отдельных событий в порядке времени
+def iter_events(batches):
+    """
+
+    Буферы из frame_events отсортированы внутри интервала, а времена событий
+    ограничены границами интервала, поэтому их достаточно выдать подряд,
+    без общей пересортировки.
+
+    """
+    for batch in batches:
+        yield from batch
+
+
+
+# Обработка потока событий скрытым слоем: выдает спайки (t, номер нейрона) по мере появления
+def hidden_spikes(
+        state,                  # состояние скрытого слоя
+        events,                 # поток событий (например, из iter_events)
+        train=False,            # обучать ли веса по STDP
+        norm_factor=1
+):
+    for ev in events:
+        hidden_layer_step(
+            state=state,
+            event=ev,
+            train=train,
+            norm_factor=norm_factor
+        )
+        # Спайки сразу отдаем дальше, чтобы буфер в состоянии не рос
+        if len(state.spikes) > 0:
+            yield from state.spikes
+            state.spikes.clear()
@@ -12,7 +12,9 @@ class Tracking_Object:
         window_size=(28,28),    # размер окна обзора камеры
         obj_radius=2,           # половина стороны квадрата
         obj_direction=(1,0),    # направление движения (dir_x, dir_y)
-        noise=0                 # максимальное отклонение от траектории
+        noise=0,                # максимальное отклонение от траектории
+        controller=None         # управление камерой спайковой сетью (sim.snn_controller.SNN_Controller);
+                                # None - камера следит за истинным положением объекта
     ):
         # Размер поля
         self.field_height, self.field_width = field_size
@@ -33,6 +35,10 @@ class Tracking_Object:
 
         # Текущая сцена (обновляется на каждом шаге)
         self.current_field = np.zeros((self.field_height, self.field_width), dtype=float)
+        # Область окна камеры, изменившаяся за последний шаг (None - весь кадр)
+        self.dirty_rect = None
+        # Контроллер камеры
+        self.controller = controller
 
 
     # Сброс симуляции
@@ -48,17 +54,65 @@ class Tracking_Object:
             window_size=(self.camera.window_width, self.camera.window_height)
         )
         self.current_field = np.zeros((self.field_height, self.field_width), dtype=float)
+        self.dirty_rect = None
+        if self.controller is not None:
+            self.controller.reset()
 
 
     # Шаг симуляции
-    def step(self):
+    def step(
+            self,
+            follow=True         # если False, камера остается на месте
+    ):
+        # Запоминаем положение объекта и камеры до шага
+        old_footprint = self.object.footprint()
+        old_camera = (self.camera.top_left_y, self.camera.top_left_x)
+        # Решение сети по последнему кадру камеры (контроллер видит и кадры периода наблюдения)
+        if self.controller is not None:
+            move = self.controller.decide(self.get_camera_view(), self.dirty_rect)
         # Двигаем объект
         self.object.step()
         # Двигаем камеру (пытаемся центрировать объект)
-        self._follow_object()
+        if follow and self.controller is not None:
+            self.camera.step(*move)
+        elif follow:
+            self._follow_object()
         # Генерируем картинку всей сцены
         self.current_field[:] = 0.0  
         self.object.fix_obj(self.current_field)  
+        # Запоминаем, какая часть обзора камеры могла измениться
+        self.dirty_rect = self._dirty_rect(old_footprint, old_camera)
+
+
+    # Объединение старого и нового положения объекта в координатах окна камеры
+    def _dirty_rect(self, old_footprint, old_camera):
+        """
+
+        Фон сцены черный, поэтому между соседними кадрами камеры меняются только пиксели,
+        которые занимал объект до шага (со сдвигом на старое положение камеры)
+        и после шага (со сдвигом на новое положение камеры).
+        Возвращает (y_min, y_max, x_min, x_max); если объект не виден, область пустая.
+
+        """
+        rects = (
+            (old_footprint, old_camera),
+            (self.object.footprint(), (self.camera.top_left_y, self.camera.top_left_x))
+        )
+        y_min, x_min = self.camera.window_height, self.camera.window_width
+        y_max, x_max = 0, 0
+        for (fy0, fy1, fx0, fx1), (cam_y, cam_x) in rects:
+            # Переводим в координаты окна и обрезаем по его границам
+            y0 = max(int(fy0 - cam_y), 0)
+            y1 = min(int(fy1 - cam_y), self.camera.window_height)
+            x0 = max(int(fx0 - cam_x), 0)
+            x1 = min(int(fx1 - cam_x), self.camera.window_width)
+            if y0 >= y1 or x0 >= x1:
+                continue
+            y_min, y_max = min(y_min, y0), max(y_max, y1)
+            x_min, x_max = min(x_min, x0), max(x_max, x1)
+        if y_min >= y_max or x_min >= x_max:
+            return (0, 0, 0, 0)
+        return (y_min, y_max, x_min, x_max)
 
 
     # Простое слежение за объектом (без snn)
@@ -0,0 +1,76 @@
+import os
+import time
+import numpy as np
+from concurrent.futures import ProcessPoolExecutor
+
+from core.params import NetworkParams
+from core.hidden_layer import HiddenLayerState, init_hidden_layer, hidden_weights
+from train.train_tracker import run_episode, init_worker
+from utils.data_converter import load_pickle
+
+
+"""
+
+Проверка обученного выходного слоя: эпизоды слежения без обучения (веса не меняются).
+
+"""
+
+
+# Качество слежения с весами weights (например, из train_tracker)
+def evaluate_tracker(
+        weights,                # веса выходного слоя
+        num_episodes=32,
+        workers=None,           # количество процессов (по умолчанию - количество ядер)
+        params=None,            # гиперпараметры сети (NetworkParams или словарь)
+        hidden=None,            # скрытый слой, с которым обучался выходной
+        config=None,            # настройки эпизода (train.train_tracker.EPISODE_CONFIG)
+        seed=10**6,             # зерна эпизодов не пересекаются с обучающими
+        verbose=True
+):
+    if params is None:
+        params = NetworkParams.from_config()
+    elif not isinstance(params, NetworkParams):
+        params = NetworkParams.from_dict(params)
+    workers = workers or os.cpu_count()
+    if hidden is None:
+        np.random.seed(0)
+        hidden = init_hidden_layer(params)
+
+    start = time.perf_counter()
+    seeds = range(seed, seed + num_episodes)
+    with ProcessPoolExecutor(
+        max_workers=workers,
+        initializer=init_worker,
+        initargs=(hidden_weights(hidden), params)
+    ) as pool:
+        results = list(pool.map(
+            run_episode,
+            [weights] * num_episodes, seeds, [config] * num_episodes, [False] * num_episodes
+        ))
+    elapsed = time.perf_counter() - start
+
+    errors = np.array([r["error"] for r in results])
+    stats = {
+        "episodes": num_episodes,
+        "mean_error": float(errors.mean()),
+        "max_error": float(errors.max()),
+        "events_per_s": sum(r["events"] for r in results) / elapsed
+    }
+    if verbose:
+        print(
+            f"{num_episodes} episodes: mean error {stats['mean_error']:.2f} px, "
+            f"max error {stats['max_error']:.2f} px, {stats['events_per_s']:.0f} events/s"
+        )
+    return stats
+
+
+
+
+if __name__ == "__main__":
+    saved = load_pickle("data/tracker_weights.pkl")
+    params = NetworkParams.from_dict(saved["params"])
+    evaluate_tracker(
+        saved["weights"],
+        params=params,
+        hidden=HiddenLayerState(params, saved["hidden_weights"])
+    )
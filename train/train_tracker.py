@@ -0,0 +1,235 @@
+import os
+import time
+import numpy as np
+from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
+
+from core.params import NetworkParams
+from core.hidden_layer import HiddenLayerState, init_hidden_layer, hidden_weights
+from core.output_layer import init_output_layer, output_weights
+from core.learning import reward_pstdp_delta
+from sim.tracking_object import Tracking_Object
+from sim.snn_controller import SNN_Controller, OUT_MOVES
+from utils.data_converter import save_pickle
+
+
+"""
+
+Обучение выходного слоя слежению за объектом с наградой (p-STDP).
+Эпизоды (Tracking_Object + SNN_Controller) независимы и выполняются в пуле процессов.
+Каждый эпизод работает с копией общих весов выходного слоя и возвращает
+сумму изменений OUT_ETA * reward * eligibility; изменения эпизодов складываются
+в общие веса синхронно (после раунда) или асинхронно (по мере завершения эпизодов).
+
+"""
+
+
+# Настройки эпизода по умолчанию
+EPISODE_CONFIG = {
+    "steps": 60,                # количество шагов симуляции
+    "observe_steps": 5,         # первые шаги камера не двигается
+    "dt": 33,                   # время между кадрами (мс)
+    "field_size": (80, 80),
+    "window_size": (28, 28),
+    "obj_radius": 3,
+    "noise": 1
+}
+# Расстояние (по каждой оси) от объекта до центра камеры, при котором объект считается в центре
+CENTER_TOLERANCE = 2
+
+# Скрытый слой рабочего процесса (задается один раз при запуске пула)
+_hidden_weights = None
+_params = None
+
+
+
+
+# Инициализация рабочего процесса: общий (необучаемый) скрытый слой и гиперпараметры
+def init_worker(hidden_weights, params):
+    global _hidden_weights, _params
+    _hidden_weights = hidden_weights
+    _params = params
+
+
+
+# Расстояние от объекта до центра камеры по осям
+def _offset(simulator):
+    cam_cx = simulator.camera.top_left_x + simulator.camera.window_width // 2
+    cam_cy = simulator.camera.top_left_y + simulator.camera.window_height // 2
+    return simulator.object.center_x - cam_cx, simulator.object.center_y - cam_cy
+
+
+
+# Награда за шаг: +1, если объект в центре или камера приблизилась к нему, иначе -1
+def _reward(offset_before, offset_after):
+    dist_before = max(abs(offset_before[0]), abs(offset_before[1]))
+    dist_after = max(abs(offset_after[0]), abs(offset_after[1]))
+    if dist_after <= CENTER_TOLERANCE or dist_after < dist_before:
+        return 1
+    return -1
+
+
+
+# Один эпизод слежения с фиксированными весами выходного слоя
+def run_episode(
+        out_weights,            # веса выходного слоя (float32)
+        seed,                   # зерно эпизода (направление объекта, шум, события)
+        config=None,            # настройки эпизода (EPISODE_CONFIG)
+        learn=True              # считать ли изменения весов по награде
+):
+    """
+
+    Возвращает словарь:
+        delta   - сумма OUT_ETA * reward * eligibility по шагам эпизода
+        reward  - суммарная награда
+        error   - среднее расстояние от объекта до центра камеры (пиксели)
+        frames, events - количество обработанных кадров и событий
+
+    """
+    config = EPISODE_CONFIG if config is None else {**EPISODE_CONFIG, **config}
+    np.random.seed(seed)
+
+    hidden = HiddenLayerState(_params, _hidden_weights.copy())
+    output = init_output_layer(_params)
+    output.weights[:] = out_weights
+    controller = SNN_Controller(
+        window_size=config["window_size"],
+        dt=config["dt"],
+        hidden=hidden,
+        output=output,
+        policy="none"
+    )
+    simulator = Tracking_Object(
+        field_size=config["field_size"],
+        window_size=config["window_size"],
+        obj_radius=config["obj_radius"],
+        obj_direction=OUT_MOVES[np.random.randint(len(OUT_MOVES))],
+        noise=config["noise"],
+        controller=controller
+    )
+    simulator.reset()
+
+    delta = np.zeros_like(out_weights)
+    total_reward = 0
+    errors = []
+    for step_i in range(config["steps"]):
+        follow = step_i >= config["observe_steps"]
+        offset_before = _offset(simulator)
+        simulator.step(follow=follow)
+        offset_after = _offset(simulator)
+        errors.append(max(abs(offset_after[0]), abs(offset_after[1])))
+        if not (follow and learn):
+            continue
+        # Награда за решение, принятое на этом шаге, с eligibility на момент решения
+        reward = _reward(offset_before, offset_after)
+        total_reward += reward
+        delta += reward_pstdp_delta(output.eligibility.value(controller.t), reward, _params)
+
+    return {
+        "delta": delta,
+        "reward": total_reward,
+        "error": float(np.mean(errors)),
+        "frames": config["steps"],
+        "events": controller.num_events
+    }
+
+
+
+# Обучение выходного слоя на эпизодах в пуле процессов
+def train_tracker(
+        num_episodes=64,            # общее количество эпизодов
+        workers=None,               # количество процессов (по умолчанию - количество ядер)
+        mode="sync",                # "sync" - раунды по workers эпизодов, "async" - по мере готовности
+        params=None,                # гиперпараметры сети (NetworkParams или словарь)
+        hidden=None,                # обученный скрытый слой (по умолчанию - случайный)
+        config=None,                # настройки эпизода (EPISODE_CONFIG)
+        seed=0,
+        save_path=None,             # куда сохранить веса выходного слоя (.pkl)
+        verbose=True
+):
+    """
+
+    sync: в каждом раунде workers эпизодов получают одни и те же веса,
+          после раунда к весам добавляется среднее изменение эпизодов.
+    async: в работе всегда workers эпизодов; изменение каждого завершенного эпизода
+           сразу добавляется к общим весам, и новый эпизод стартует с текущими весами
+           (веса в работающих эпизодах отстают не более чем на workers обновлений).
+    Возвращает веса выходного слоя и статистику (эпизоды/с, события/с, награда, ошибка слежения).
+
+    """
+    if mode not in ("sync", "async"):
+        raise ValueError(f"Неизвестный режим {mode}, допустимые: sync, async")
+    if params is None:
+        params = NetworkParams.from_config()
+    elif not isinstance(params, NetworkParams):
+        params = NetworkParams.from_dict(params)
+    workers = workers or os.cpu_count()
+
+    np.random.seed(seed)
+    if hidden is None:
+        hidden = init_hidden_layer(params)
+    weights = output_weights(init_output_layer(params)).astype(np.float32)
+
+    results = []
+    start = time.perf_counter()
+    with ProcessPoolExecutor(
+        max_workers=workers,
+        initializer=init_worker,
+        initargs=(hidden_weights(hidden), params)
+    ) as pool:
+        if mode == "sync":
+            for round_start in range(0, num_episodes, workers):
+                seeds = range(seed + round_start, seed + min(round_start + workers, num_episodes))
+                round_results = list(pool.map(run_episode, [weights] * len(seeds), seeds, [config] * len(seeds)))
+                _merge(weights, np.mean([r["delta"] for r in round_results], axis=0), params)
+                results.extend(round_results)
+        else:
+            next_episode = 0
+            running = set()
+            while next_episode < num_episodes or running:
+                while next_episode < num_episodes and len(running) < workers:
+                    running.add(pool.submit(run_episode, weights.copy(), seed + next_episode, config))
+                    next_episode += 1
+                done, running = wait(running, return_when=FIRST_COMPLETED)
+                for future in done:
+                    result = future.result()
+                    _merge(weights, result["delta"], params)
+                    results.append(result)
+    elapsed = time.perf_counter() - start
+
+    stats = {
+        "episodes": len(results),
+        "episodes_per_s": len(results) / elapsed,
+        "events_per_s": sum(r["events"] for r in results) / elapsed,
+        "frames_per_s": sum(r["frames"] for r in results) / elapsed,
+        "mean_reward": float(np.mean([r["reward"] for r in results])),
+        "mean_error": float(np.mean([r["error"] for r in results])),
+        "seconds": elapsed
+    }
+    if verbose:
+        print(
+            f"[{mode}, {workers} workers] {stats['episodes']} episodes in {elapsed:.1f} s: "
+            f"{stats['episodes_per_s']:.2f} episodes/s, {stats['events_per_s']:.0f} events/s, "
+            f"mean reward {stats['mean_reward']:.2f}, mean error {stats['mean_error']:.2f} px"
+        )
+    if save_path is not None:
+        save_pickle(save_path, {
+            "weights": weights,
+            "hidden_weights": hidden_weights(hidden),
+            "params": params.to_dict(),
+            "stats": stats
+        })
+    return weights, stats
+
+
+
+# Добавление изменения к общим весам с ограничением диапазона (как в apply_reward_pstdp)
+def _merge(weights, delta, params):
+    weights += delta
+    np.clip(weights, params.W_MIN, params.W_MAX, out=weights)
+
+
+
+
+if __name__ == "__main__":
+    train_tracker(mode="sync", save_path="data/tracker_weights.pkl")
+    train_tracker(mode="async")
@@ -0,0 +1,234 @@
+import copy
+import time
+import random
+import numpy as np
+
+import core.global_config as cfg
+from core.params import NetworkParams
+from core.input_layer import generate_events_batch
+from core.hidden_layer import (
+    BIN_MS,
+    init_hidden_layer,
+    reset_hidden_layer,
+    hidden_weights,
+    hidden_layer_step,
+    hidden_layer_run,
+    hidden_layer_run_binned
+)
+from genetic.operators import generate_params
+from utils.data_converter import load_pickle, stack_frames
+
+
+"""
+
+Сравнение режимов скрытого слоя: обе сети стартуют из одного состояния
+и получают одинаковые события.
+compare_modes - приближенный режим (hidden_layer_run_binned) против пособытийного (hidden_layer_step).
+compare_run_step - блочный событийный режим (hidden_layer_run) против пособытийного
+(hidden_layer_step) на наборах параметров ГА.
+
+"""
+
+
+
+
+# Прогон одного режима по всем примерам; возвращает спайки каждого примера и время работы
+def _run_mode(state, events, offsets, run, ev_per_frame, train, seed):
+    # Одинаковый поток шума для выбора победителя в обоих режимах
+    np.random.seed(seed)
+    spikes = []
+    start = time.perf_counter()
+    for n in range(offsets.shape[0]):
+        for k in range(offsets.shape[1] - 1):
+            chunk = events[offsets[n, k]:offsets[n, k + 1]]
+            norm_factor = min(1.0, ev_per_frame / (len(chunk) + 1e-12))
+            run(state, chunk, train=train, norm_factor=norm_factor)
+        spikes.append((state.spikes.times.copy(), state.spikes.neurons.copy()))
+        reset_hidden_layer(state)
+    return spikes, time.perf_counter() - start
+
+
+
+# Пособытийная обработка интервала (эталон для hidden_layer_run и hidden_layer_run_binned)
+def _run_per_event(state, events, train=True, norm_factor=1):
+    for event in events:
+        hidden_layer_step(state, event, train=train, norm_factor=norm_factor)
+
+
+
+# Доля спайков ref, для которых в test есть спайк того же нейрона не дальше tol (мс)
+def _matched_fraction(ref, test, tol):
+    total = matched = 0
+    for (t_ref, n_ref), (t_test, n_test) in zip(ref, test):
+        total += len(t_ref)
+        for neuron in np.unique(n_ref):
+            a = t_ref[n_ref == neuron]
+            b = t_test[n_test == neuron]
+            if len(b) == 0:
+                continue
+            # Ближайший спайк того же нейрона в test
+            pos = np.clip(np.searchsorted(b, a), 1, len(b)) - 1
+            nearest = np.minimum(
+                np.abs(a - b[pos]),
+                np.abs(a - b[np.minimum(pos + 1, len(b) - 1)])
+            )
+            matched += int((nearest <= tol).sum())
+    return matched / total if total else 1.0
+
+
+
+# Расхождение спайков binned-режима с пособытийным для нескольких ширин окна
+def compare_modes(
+        dataset,                        # датасет (список словарей с "frames")
+        params=None,                    # гиперпараметры сети (NetworkParams или словарь)
+        bin_sizes=(0.25, 0.5, BIN_MS, 2.0),
+        num_samples=100,                # сколько примеров датасета прогнать
+        train=False,                    # обучать ли веса по STDP во время прогона
+        ev_per_frame=40,                # желаемое количество событий между кадрами (norm_factor)
+        seed=0,
+        verbose=True
+):
+    """
+
+    Для каждой ширины окна возвращает словарь метрик:
+        spikes      - отношение общего числа спайков к пособытийному режиму
+        count_mae   - среднее по примерам |разница числа спайков|
+        neuron_tv   - среднее по примерам расстояние полной вариации между
+                      распределениями спайков по нейронам (0 - совпадают, 1 - не пересекаются)
+        winner      - доля примеров с тем же самым активным нейроном
+        matched     - доля спайков пособытийного режима, у которых есть спайк
+                      того же нейрона не дальше ширины окна
+        weights_mae - среднее |разница весов| после прогона (только при train=True)
+        speedup     - ускорение относительно hidden_layer_step
+
+    """
+    if params is None:
+        params = NetworkParams.from_config()
+    elif not isinstance(params, NetworkParams):
+        params = NetworkParams.from_dict(params)
+
+    frames = stack_frames(dataset[:num_samples])
+    events, offsets = generate_events_batch(
+        frames, cfg.FRAME_DT_MS, rng=np.random.RandomState(seed)
+    )
+    np.random.seed(seed)
+    initial = init_hidden_layer(params)
+
+    ref_state = copy.deepcopy(initial)
+    ref, ref_time = _run_mode(ref_state, events, offsets, _run_per_event, ev_per_frame, train, seed)
+    ref_counts = np.array([np.bincount(n, minlength=cfg.COUNT_NEURONS) for _, n in ref])
+
+    report = {}
+    for bin_ms in bin_sizes:
+        state = copy.deepcopy(initial)
+        run = lambda s, e, **kw: hidden_layer_run_binned(s, e, bin_ms=bin_ms, **kw)
+        test, test_time = _run_mode(state, events, offsets, run, ev_per_frame, train, seed)
+        counts = np.array([np.bincount(n, minlength=cfg.COUNT_NEURONS) for _, n in test])
+
+        ref_total = ref_counts.sum(axis=1)
+        total = counts.sum(axis=1)
+        # Распределения спайков по нейронам (пример без спайков - пустое распределение)
+        p_ref = ref_counts / np.maximum(ref_total, 1)[:, None]
+        p = counts / np.maximum(total, 1)[:, None]
+        both = (ref_total > 0) & (total > 0)
+
+        report[bin_ms] = {
+            "spikes": total.sum() / max(ref_total.sum(), 1),
+            "count_mae": float(np.abs(total - ref_total).mean()),
+            "neuron_tv": float(0.5 * np.abs(p - p_ref)[both].sum(axis=1).mean()) if both.any() else 0.0,
+            "winner": float((ref_counts.argmax(axis=1) == counts.argmax(axis=1))[both].mean()) if both.any() else 1.0,
+            "matched": _matched_fraction(ref, test, bin_ms),
+            "weights_mae": float(np.abs(hidden_weights(state) - hidden_weights(ref_state)).mean()) if train else 0.0,
+            "speedup": ref_time / test_time
+        }
+
+    if verbose:
+        print(f"events: {len(events)}, spikes (per-event): {int(ref_counts.sum())}")
+        print("bin_ms   spikes  count_mae  neuron_tv  winner  matched  weights_mae  speedup")
+        for bin_ms, m in report.items():
+            print(
+                f"{bin_ms:6.2f}  {m['spikes']:6.3f}  {m['count_mae']:9.3f}  {m['neuron_tv']:9.3f}  "
+                f"{m['winner']:6.3f}  {m['matched']:7.3f}  {m['weights_mae']:11.3f}  {m['speedup']:7.2f}"
+            )
+    return report
+
+
+
+
+# Расхождение hidden_layer_run с hidden_layer_step на параметрах ГА
+def compare_run_step(
+        dataset,                        # датасет (список словарей с "frames")
+        params_list=None,               # наборы гиперпараметров (словари или NetworkParams)
+        num_params=5,                   # сколько наборов genetic.operators.generate_params взять, если params_list не задан
+        num_samples=300,                # сколько примеров датасета прогнать
+        train=True,                     # обучать ли веса по STDP (как в evaluate_selectivity)
+        ev_per_frame=40,                # желаемое количество событий между кадрами (norm_factor)
+        seed=0,
+        verbose=True
+):
+    """
+
+    Без params_list сравниваются параметры из global_config и num_params наборов ГА.
+    Для каждого набора параметров возвращает словарь:
+        identical       - доля примеров с полностью совпадающими спайками
+        first_diverged  - номер первого примера, где спайки разошлись (None - не разошлись)
+        spikes          - отношение числа спайков hidden_layer_run к hidden_layer_step
+        weights_max     - максимум |разница весов| после прогона
+        speedup         - ускорение hidden_layer_run относительно hidden_layer_step
+
+    """
+    if params_list is None:
+        random_state = random.getstate()
+        random.seed(seed)
+        params_list = [NetworkParams.from_config()] + [generate_params() for _ in range(num_params)]
+        random.setstate(random_state)
+        names = ["config"] + [f"ga {k + 1}" for k in range(num_params)]
+    else:
+        names = [str(k) for k in range(len(params_list))]
+
+    frames = stack_frames(dataset[:num_samples])
+    events, offsets = generate_events_batch(
+        frames, cfg.FRAME_DT_MS, rng=np.random.RandomState(seed)
+    )
+
+    report = []
+    for params in params_list:
+        if not isinstance(params, NetworkParams):
+            params = NetworkParams.from_dict(params)
+        np.random.seed(seed)
+        initial = init_hidden_layer(params)
+        ref_state = copy.deepcopy(initial)
+        ref, ref_time = _run_mode(ref_state, events, offsets, _run_per_event, ev_per_frame, train, seed)
+        state = copy.deepcopy(initial)
+        test, test_time = _run_mode(state, events, offsets, hidden_layer_run, ev_per_frame, train, seed)
+
+        same = [
+            np.array_equal(t_ref, t_test) and np.array_equal(n_ref, n_test)
+            for (t_ref, n_ref), (t_test, n_test) in zip(ref, test)
+        ]
+        report.append({
+            "identical": float(np.mean(same)),
+            "first_diverged": None if all(same) else same.index(False),
+            "spikes": sum(len(n) for _, n in test) / max(sum(len(n) for _, n in ref), 1),
+            "weights_max": float(np.abs(hidden_weights(state) - hidden_weights(ref_state)).max()),
+            "speedup": ref_time / test_time
+        })
+
+    if verbose:
+        print(f"events: {len(events)}, samples: {len(offsets)}")
+        print("params  identical  first_diverged  spikes  weights_max  speedup")
+        for name, m in zip(names, report):
+            first = "-" if m["first_diverged"] is None else str(m["first_diverged"])
+            print(
+                f"{name:6s}  {m['identical']:9.3f}  {first:>14s}  {m['spikes']:6.3f}  "
+                f"{m['weights_max']:11.3f}  {m['speedup']:7.2f}"
+            )
+    return report
+
+
+
+
+if __name__ == "__main__":
+    compare_run_step(load_pickle(cfg.DATASET_PATH))
+    compare_modes(load_pickle(cfg.DATASET_PATH), num_samples=200)
+    compare_modes(load_pickle(cfg.DATASET_PATH), num_samples=200, train=True)
@@ -1,19 +1,32 @@
 import pickle
 import os
+import shutil
+import hashlib
+import tempfile
 import numpy as np
 from PIL import Image
 
-from core.input_layer import init_event_generator, generate_events
+import core.input_layer as il
+from core.events import EVENT_DTYPE, empty_events
+from core.input_layer import generate_events_batch
 from utils.visualization import plot_events, plot_events_3d, show_trajectory
 
 
 
 
 # Сохранение объекта data в файл .pkl по пути save_path
+# (через временный файл, чтобы при обрыве записи старый файл остался целым)
 def save_pickle(save_path, data):
-    os.makedirs(os.path.dirname(save_path), exist_ok=True)
-    with open(save_path, "wb") as f:
+    # Путь без каталога - файл в текущем каталоге
+    dirname = os.path.dirname(save_path)
+    if dirname:
+        os.makedirs(dirname, exist_ok=True)
+    tmp_path = f"{save_path}.{os.getpid()}.tmp"
+    with open(tmp_path, "wb") as f:
         pickle.dump(data, f)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, save_path)
 
 
 
@@ -27,6 +40,131 @@ def load_pickle(load_path="data/dataset_custom.pkl"):
 
 
 
+# Кадры всех примеров датасета одним массивом (N, T, H, W)
+def stack_frames(dataset):
+    return np.stack([np.stack(sample["frames"]) for sample in dataset]).astype(np.float32)
+
+
+
+# Колонки событий в хранилище (по одному файлу .npy на колонку)
+EVENT_COLUMNS = EVENT_DTYPE.names
+
+
+
+# Ключ хранилища событий: хэш кадров и констант входного слоя
+def event_store_key(
+        frames,             # кадры датасета (N, T, H, W)
+        dt,                 # время между кадрами (мс)
+        seed                # seed случайных смещений времени событий
+):
+    h = hashlib.sha1()
+    h.update(np.ascontiguousarray(frames, dtype=np.float32).tobytes())
+    h.update(repr((
+        frames.shape, float(dt), int(seed),
+        il.LOG_THRESHOLD, il.PIXEL_REF, EVENT_DTYPE.descr
+    )).encode())
+    return h.hexdigest()[:16]
+
+
+
+# Запись событий датасета на диск
+def save_event_store(
+        store_dir,          # каталог хранилища
+        events,             # буфер событий всех примеров (core.events)
+        offsets             # границы примеров и интервалов (N, T) из generate_events_batch
+):
+    """
+
+    Формат: каталог с файлами t.npy, x.npy, y.npy, p.npy (колонки событий)
+    и offsets.npy (индекс границ). Сначала пишется временный каталог (у каждого
+    вызова свой, поэтому одновременные записи не мешают друг другу), затем он
+    переименовывается, чтобы недописанное хранилище не было прочитано.
+
+    """
+    store_dir = store_dir.rstrip(os.sep)
+    parent = os.path.dirname(os.path.abspath(store_dir))
+    os.makedirs(parent, exist_ok=True)
+    tmp_dir = tempfile.mkdtemp(dir=parent, prefix=os.path.basename(store_dir) + ".", suffix=".tmp")
+    for name in EVENT_COLUMNS:
+        np.save(os.path.join(tmp_dir, name + ".npy"), np.ascontiguousarray(events[name]))
+    np.save(os.path.join(tmp_dir, "offsets.npy"), offsets)
+    shutil.rmtree(store_dir, ignore_errors=True)
+    try:
+        os.replace(tmp_dir, store_dir)
+    except OSError:
+        # Другой процесс успел записать хранилище раньше - оставляем его запись
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+        if not os.path.exists(os.path.join(store_dir, "offsets.npy")):
+            raise
+
+
+
+# Открытие хранилища событий (файлы отображаются в память и читаются по мере обращения)
+def load_event_store(store_dir, mmap=True):
+    if not os.path.exists(os.path.join(store_dir, "offsets.npy")):
+        raise FileNotFoundError(f"Хранилище событий {store_dir} не найдено")
+    mode = "r" if mmap else None
+    store = {
+        name: np.load(os.path.join(store_dir, name + ".npy"), mmap_mode=mode)
+        for name in EVENT_COLUMNS
+    }
+    # Индекс маленький, его читаем целиком
+    store["offsets"] = np.load(os.path.join(store_dir, "offsets.npy"))
+    return store
+
+
+
+# Хранилище в памяти из буфера событий и границ (тот же формат, что у load_event_store)
+def event_store_from_arrays(events, offsets):
+    store = {name: events[name] for name in EVENT_COLUMNS}
+    store["offsets"] = offsets
+    return store
+
+
+
+# События одного примера из хранилища (буфер core.events)
+def store_sample_events(
+        store,              # словарь из load_event_store
+        n,                  # номер примера
+        interval=None       # номер интервала между кадрами (None - весь пример)
+):
+    offsets = store["offsets"]
+    if interval is None:
+        start, end = offsets[n, 0], offsets[n, -1]
+    else:
+        start, end = offsets[n, interval], offsets[n, interval + 1]
+    events = empty_events(end - start)
+    for name in EVENT_COLUMNS:
+        events[name] = store[name][start:end]
+    return events
+
+
+
+# Каталог хранилища событий для кадров frames
+def event_store_path(frames, dt, seed=0, cache_dir="data/events"):
+    return os.path.join(cache_dir, event_store_key(frames, dt, seed))
+
+
+
+# Загрузка событий датасета из хранилища (при отсутствии - генерация и запись)
+def load_or_generate_events(
+        frames,                     # кадры датасета (N, T, H, W)
+        dt,                         # время между кадрами (мс)
+        seed=0,                     # seed случайных смещений времени событий
+        cache_dir="data/events"     # каталог с хранилищами
+):
+    store_dir = event_store_path(frames, dt, seed, cache_dir)
+    if not os.path.exists(store_dir):
+        events, offsets = generate_events_batch(
+            frames=frames,
+            dt=dt,
+            rng=np.random.RandomState(seed)
+        )
+        save_event_store(store_dir, events, offsets)
+    return load_event_store(store_dir)
+
+
+
 # Получение изображения из массива нормализованных яркостей
 def arr_to_image(image_arr, save_path=None):
     image = image_arr * 255.0
@@ -52,18 +190,26 @@ def dataset_dict_to_image(dataset_path, num_ex=1):
 
 
 # Проверка генерации событий на датасете
-def dataset_dict_to_events(dataset_path, dt=16.7, num_ex=1):
+def dataset_dict_to_events(dataset_path, dt=16.7, num_ex=1, cache_dir=None):
     dataset_dict = load_pickle(load_path=dataset_path)
     len_dataset = len(dataset_dict)
-    for _ in range(num_ex):
-        sample_index = np.random.randint(0, len_dataset)
+    sample_indices = np.random.randint(0, len_dataset, num_ex)
+    if cache_dir is None:
+        # События для всех выбранных примеров генерируем за один проход
+        events, offsets = generate_events_batch(
+            frames=stack_frames([dataset_dict[i] for i in sample_indices]),
+            dt=dt
+        )
+    else:
+        # Берем события всего датасета из хранилища (читаются только нужные примеры)
+        store = load_or_generate_events(stack_frames(dataset_dict), dt, cache_dir=cache_dir)
+    for n, sample_index in enumerate(sample_indices):
         sample = dataset_dict[sample_index]
-        frames = sample["frames"]
-        num_frames = len(frames)
-        ev_generator = init_event_generator()
-        old_frame = frames[0]
-        cur_t = 0
-        cur_events = []
+        num_frames = len(sample["frames"])
+        if cache_dir is None:
+            cur_events = events[offsets[n, 0]:offsets[n, -1]]
+        else:
+            cur_events = store_sample_events(store, sample_index)
 
         info = (
             "direction: " + str(sample["direction"]) +
@@ -71,22 +217,8 @@ def dataset_dict_to_events(dataset_path, dt=16.7, num_ex=1):
             ", style: " + str(sample["style"]) +
             ", start_pos: " + str(sample["start_pos"])
         )
-        all_ev = 0
-
-        for idx in range(1, num_frames):
-            new_frame = frames[idx]
-            ev = generate_events(
-                state=ev_generator,
-                old_frame=old_frame,
-                new_frame=new_frame,
-                prev_t=cur_t,
-                new_t=cur_t+dt
-            )
-            cur_t += dt
-            cur_events.extend(ev)
-            all_ev += len(ev)
-            old_frame = new_frame
-        
+        all_ev = len(cur_events)
+
         print(f"Среднее количество событий на кадр: {all_ev/num_frames}")
         plot_events(cur_events, info=info)
         show_trajectory(sample)
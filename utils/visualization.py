@@ -10,8 +10,7 @@ import matplotlib.cm
 def plot_events(events, info=None):
     """
 
-    events: список событий [(t_1, x_1, y_1, p_1), ..., (t_n, x_n, y_n, p_n)]
-    dt: время между кадрами
+    events: буфер событий (core.events) с колонками t, x, y, p
 
     Строит:
         1) гистограмму по времени (сколько событий в каждом промежутке)
@@ -20,16 +19,16 @@ def plot_events(events, info=None):
             -- красный: пиксель стал темнее (полярность p=0)
 
     """
-    if not events:
+    if len(events) == 0:
         return
 
-    times = [e[0] for e in events]
-    xs = [int(e[1]) for e in events]
-    ys = [int(e[2]) for e in events]
-    ps = [e[3] for e in events]
+    times = events["t"]
+    xs = events["x"]
+    ys = events["y"]
+    ps = events["p"]
 
-    t_min = np.floor(min(times))
-    t_max = np.ceil(max(times))
+    t_min = np.floor(times.min())
+    t_max = np.ceil(times.max())
 
     bin_width = 1.0  # Шаг 1 мс
     bins = np.arange(t_min, t_max + bin_width, bin_width)
@@ -67,13 +66,13 @@ def plot_events(events, info=None):
 
 
 def plot_events_3d(events, info=None):
-    if not events:
+    if len(events) == 0:
         return
 
-    times = [e[0] for e in events]
-    xs = [e[1] for e in events]
-    ys = [e[2] for e in events]
-    ps = [e[3] for e in events] 
+    times = events["t"]
+    xs = events["x"]
+    ys = events["y"]
+    ps = events["p"]
 
     fig = plt.figure()
     ax = fig.add_subplot(111, projection='3d')